@@ -1,17 +1,23 @@
-from threading import Thread
-from dotenv import load_dotenv
+from dotenv import load_dotenv, find_dotenv
+import asyncio
 import os
-import queue
 import psutil
 import logging
-import time
-import json
 
 import __version__
 
+from workers.startup_timeline import TIMELINE
+from workers.log_pipeline import LOGS
+from workers.config import Config, ConfigWatcher
+from workers.displays import load_displays
+from workers.message_bus import MessageBus
+from workers.metrics import MetricsWorker
 from workers.mqtt_worker import MQTTWorker
 from workers.kiosk_worker import UICompositor
 from workers.system_worker import SystemWorker
+from workers.supervisor import SUPERVISOR
+
+TIMELINE.mark("imports")
 
 _logger = None
 
@@ -25,67 +31,97 @@ def get_mac_by_name(ifname: str):
             return addr.address.replace("-", ":")
 
 
-def message_loop(system_worker: SystemWorker, ui_compositor: UICompositor,
-                 mqtt_worker: MQTTWorker, message_queue: queue.Queue):
-    while True:
-        time.sleep(0.1)
-        if message_queue.empty():
-            continue
-        message = message_queue.get(True)
-
-        _logger.debug("New message %s", json.dumps(message))
+async def shutdown(system_worker: SystemWorker, mqtt_worker: MQTTWorker,
+                   metrics_worker: MetricsWorker, config_watcher,
+                   message_bus: MessageBus):
+    await SUPERVISOR.stop()
+    if config_watcher is not None:
+        await config_watcher.stop()
+    await metrics_worker.stop()
+    await system_worker.stop()
+    await mqtt_worker.stop()
+    message_bus.stop()
+
+
+async def main(working_directory: str, unique_id: str, mac_addr: str,
+               config: Config, config_path: str):
+    message_bus = MessageBus()
+    displays = load_displays(config)
+
+    ui_compositors = [UICompositor(working_directory, unique_id, message_bus,
+                                   display, config)
+                      for display in displays]
+    system_worker = SystemWorker(message_bus, displays=displays,
+                                 config=config)
+
+    mqtt_worker = MQTTWorker(unique_id, mac_addr, message_bus, displays,
+                             config)
+    metrics_worker = MetricsWorker(message_bus, mqtt_worker, config)
+    config_watcher = None
+    if config_path:
+        config_watcher = ConfigWatcher(config_path, message_bus, config)
+
+    for ui_compositor in ui_compositors:
+        message_bus.subscribe(UICompositor.HANDLED_COMMANDS,
+                              ui_compositor.push_command)
+    message_bus.subscribe(SystemWorker.HANDLED_COMMANDS,
+                          system_worker.push_command)
+    message_bus.subscribe(MQTTWorker.HANDLED_COMMANDS,
+                          mqtt_worker.push_command)
+    message_bus.subscribe(MetricsWorker.HANDLED_COMMANDS,
+                          metrics_worker.push_command)
+    message_bus.subscribe(SUPERVISOR.HANDLED_COMMANDS,
+                          SUPERVISOR.push_command)
+    message_bus.subscribe(["exit"],
+                          lambda message: shutdown(system_worker,
+                                                   mqtt_worker,
+                                                   metrics_worker,
+                                                   config_watcher,
+                                                   message_bus))
+
+    message_bus.start()
+    for ui_compositor in ui_compositors:
+        ui_compositor.start()
+    mqtt_worker.start()
+    system_worker.start()
+    metrics_worker.start()
+    if config_watcher is not None:
+        config_watcher.start()
 
-        ui_compositor.push_command(message)
+    SUPERVISOR.watch("system", system_worker)
+    SUPERVISOR.watch("mqtt", mqtt_worker)
+    for ui_compositor in ui_compositors:
+        SUPERVISOR.watch(ui_compositor.display.suffix("browser"),
+                         ui_compositor.chrome_worker)
+    SUPERVISOR.start(message_bus, config)
 
-        if message["command"] == "exit":
-            system_worker.stop()
-            mqtt_worker.stop()
-            exit()
-        else:
-            mqtt_worker.push_command(message)
-            system_worker.push_command(message)
+    await message_bus.wait_closed()
+    _logger.info("stopped")
 
 
 if __name__ == "__main__":
-    load_dotenv()
-
-    _log_level = os.getenv("LOG_LEVEL").strip().upper()
-    if _log_level not in logging._nameToLevel:
-        _log_level = logging.WARNING
+    CONFIG_PATH = find_dotenv()
+    load_dotenv(CONFIG_PATH)
 
-    logging.basicConfig(format='%(asctime)s - (%(levelname)s) [%(name)s]: %(message)s',
-                        datefmt='%d-%m-%Y %H:%M:%S',
-                        level=_log_level,
-                        handlers=[logging.FileHandler("kiosk.log", mode='a'),
-                                  logging.StreamHandler()])
+    CONFIG = Config.from_env()
+    LOGS.setup(CONFIG)
 
     _logger = logging.getLogger("main_thread")
 
     _logger.info("Starting %s, version: %s",
                  __version__.__service_name__, __version__.__version__)
-    _logger.debug("ENV: %s", os.environ)
+    _logger.debug("ENV: %s", sorted(os.environ))
 
     WORKING_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
 
-    MAC_ADDR = get_mac_by_name(os.getenv("IFNAME"))
+    MAC_ADDR = get_mac_by_name(CONFIG.ifname)
 
     UNIQUE_ID = "kiosk-" + MAC_ADDR.replace(':', '')[-6:].lower()
 
-    MESSAGE_QUEUE = queue.Queue()
-
-    ui_compositor = UICompositor(WORKING_DIRECTORY, UNIQUE_ID)
-    system_worker = SystemWorker(MESSAGE_QUEUE)
-
-    mqtt_worker = MQTTWorker(UNIQUE_ID, MAC_ADDR, MESSAGE_QUEUE)
-
-    mqtt_worker.start()
-    system_worker.start()
-
-    message_thread = Thread(target=message_loop,
-                            kwargs={"system_worker": system_worker,
-                                    "ui_compositor": ui_compositor,
-                                    "mqtt_worker": mqtt_worker,
-                                    "message_queue": MESSAGE_QUEUE},
-                            name="message_thread")
-
-    message_thread.start()
+    try:
+        asyncio.run(main(WORKING_DIRECTORY, UNIQUE_ID, MAC_ADDR, CONFIG,
+                         CONFIG_PATH))
+    finally:
+        LOGS.stop()
+    if SUPERVISOR.exit_code:
+        os._exit(SUPERVISOR.exit_code)
@@ -0,0 +1,148 @@
+import argparse
+import json
+import logging
+import os
+import pathlib
+import statistics
+import sys
+import tempfile
+import time
+
+import psutil
+from dotenv import load_dotenv
+
+from const.chrome_profiles import CHROME_PROFILES
+from workers.chrome_profile import profile_path, save_chrome_profile
+from workers.displays import Display
+
+WORKING_DIRECTORY = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+FIXTURE = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                       "fixtures", "dashboard.html")
+FRAMES_SCRIPT = "return [window.__benchFrames, window.__benchJank];"
+
+_logger = logging.getLogger("chrome_flags")
+
+
+def tree_usage(root: psutil.Process) -> tuple:
+    cpu = 0
+    rss = 0
+    for process in [root] + root.children(recursive=True):
+        try:
+            with process.oneshot():
+                times = process.cpu_times()
+                cpu += times.user + times.system
+                rss += process.memory_info().rss
+        except psutil.NoSuchProcess:
+            continue
+    return cpu, rss
+
+
+def measure(args, flags: list, display: Display) -> dict:
+    from selenium import webdriver
+    from workers.kiosk_worker import build_chrome_options
+
+    with tempfile.TemporaryDirectory(prefix="kiosk-flags-") as user_data_dir:
+        options = build_chrome_options(display, user_data_dir, flags)
+        if args.headless:
+            options.add_argument("--headless=new")
+        driver = webdriver.Chrome(options=options)
+        try:
+            driver.get(pathlib.Path(FIXTURE).as_uri())
+            time.sleep(args.warmup)
+
+            root = psutil.Process(driver.service.process.pid)
+            frames, jank = driver.execute_script(FRAMES_SCRIPT)
+            cpu, _ = tree_usage(root)
+            started = time.monotonic()
+
+            time.sleep(args.duration)
+
+            end_frames, end_jank = driver.execute_script(FRAMES_SCRIPT)
+            end_cpu, rss = tree_usage(root)
+            elapsed = time.monotonic() - started
+        finally:
+            driver.quit()
+
+    return {
+        "fps": round((end_frames - frames) / elapsed, 1),
+        "jank_frames": end_jank - jank,
+        "cpu": round((end_cpu - cpu) / elapsed * 100, 1),
+        "rss": round(rss / 1048576, 1)
+    }
+
+
+def run_profile(args, name: str, display: Display) -> dict:
+    runs = []
+    for repeat in range(args.repeats):
+        _logger.info("profile %s, run %d of %d", name, repeat + 1,
+                     args.repeats)
+        runs.append(measure(args, CHROME_PROFILES[name], display))
+    return {metric: statistics.median(run[metric] for run in runs)
+            for metric in runs[0]}
+
+
+def choose(results: dict, tolerance: float) -> str | None:
+    measured = {name: result for name, result in results.items()
+                if "error" not in result}
+    if not measured:
+        return None
+    best_fps = max(result["fps"] for result in measured.values())
+    smooth = [name for name, result in measured.items()
+              if result["fps"] >= best_fps * (1 - tolerance)]
+    return min(smooth, key=lambda name: (measured[name]["cpu"],
+                                         measured[name]["rss"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks chromium flag profiles on a static heavy "
+                    "dashboard and saves the cheapest smooth one for the "
+                    "kiosk browser")
+    parser.add_argument("--profiles", nargs="+", choices=list(CHROME_PROFILES),
+                        default=list(CHROME_PROFILES))
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--fps-tolerance", type=float, default=0.1)
+    parser.add_argument("--window-size", default=None)
+    parser.add_argument("--headless", action="store_true")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=args.log_level.upper())
+
+    size = args.window_size or os.getenv("WINDOW_SIZE", "1280,720")
+    display = Display("bench", tuple(map(int, size.split(","))),
+                      primary=True)
+
+    results = {}
+    for name in args.profiles:
+        try:
+            results[name] = run_profile(args, name, display)
+        except Exception as e:
+            _logger.warning("profile %s failed", name, exc_info=True)
+            results[name] = {"error": str(e)}
+        _logger.info("profile %s: %s", name, results[name])
+
+    best = choose(results, args.fps_tolerance)
+    report = {"window_size": display.size, "profiles": results,
+              "best": best, "saved": None}
+    if best is not None and not args.dry_run:
+        report["saved"] = args.output or profile_path(
+            WORKING_DIRECTORY, os.getenv("CHROME_PROFILE_FILE"))
+        save_chrome_profile(report["saved"], best, results)
+    print(json.dumps(report, indent=2))
+
+    if best is None:
+        print("FAIL: no profile could be measured", file=sys.stderr)
+        sys.exit(1)
+    if os.getenv("CHROME_PROFILE"):
+        print(f"NOTE: CHROME_PROFILE={os.getenv('CHROME_PROFILE')} overrides "
+              f"the saved profile", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
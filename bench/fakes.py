@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+from workers.message_bus import MessageBus
+
+DEVICE_STATE_ACTIVATED = 100
+
+
+class BenchMessageBus(MessageBus):
+    def __init__(self):
+        super().__init__()
+        self.handled = {}
+
+    def complete(self, message):
+        super().complete(message)
+        if "bench_id" in message:
+            self.handled[message["bench_id"]] = time.monotonic()
+
+
+class FakeBacklight:
+    def __init__(self, brightness: int = 50):
+        self.brightness = brightness
+        self.power = True
+        self.writes = 0
+
+    def get_brightness(self) -> int:
+        return self.brightness
+
+    def set_brightness(self, value: int):
+        self.brightness = value
+        self.writes += 1
+
+    def get_power(self) -> bool:
+        return self.power
+
+    def set_power(self, on: bool):
+        self.power = on
+
+
+class FakeNetworkMonitor:
+    def __init__(self, message_bus, name: str = "bench"):
+        self.message_bus = message_bus
+        self.name = name
+
+    def start(self):
+        self.message_bus.put({
+            "command": "if_state",
+            "arg": {"state": DEVICE_STATE_ACTIVATED, "name": self.name}
+        })
+
+    async def stop(self):
+        pass
+
+
+class FakeUIWorker:
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def quit(self):
+        pass
+
+    async def wait_stopped(self):
+        pass
+
+    def push_command(self, command):
+        pass
+
+
+class FakeChromeWorker:
+    def __init__(self, message_bus, round_trip: float = 0.002):
+        self.message_bus = message_bus
+        self.round_trip = round_trip
+        self.running = False
+        self.message_queue = asyncio.Queue()
+        self.worker_task = None
+
+    def start(self):
+        self.running = True
+        self.worker_task = asyncio.create_task(self._run())
+        self.message_bus.put({"command": "dashboard_ready"})
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self.message_queue.put_nowait(None)
+
+    async def wait_stopped(self):
+        if self.worker_task is not None:
+            await self.worker_task
+
+    def is_running(self) -> bool:
+        return self.running
+
+    def push_command(self, message):
+        self.message_queue.put_nowait(message)
+
+    async def _run(self):
+        while True:
+            message = await self.message_queue.get()
+            if message is None:
+                break
+            await asyncio.sleep(self.round_trip)
+            self.message_bus.complete(message)
@@ -0,0 +1,259 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import time
+
+from bench.mqtt_broker import MQTTBroker
+
+CONFIG_SUFFIX = "/config"
+AVAILABILITY_SUFFIX = "/availability"
+HA_STATUS_TOPIC = "homeassistant/status"
+RATE_SAMPLE_INTERVAL = 1
+POLL_INTERVAL = 0.05
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+class RateSampler:
+    def __init__(self, broker: MQTTBroker):
+        self.broker = broker
+        self.samples = []
+        self.started = 0
+        self.first = 0
+        self.last_at = 0
+        self.last = 0
+        self.task = None
+
+    def start(self):
+        self.samples = []
+        self.started = self.last_at = time.monotonic()
+        self.first = self.last = self.broker.stats["messages_in"]
+        self.task = asyncio.create_task(self._run())
+
+    def _sample(self):
+        now = time.monotonic()
+        current = self.broker.stats["messages_in"]
+        self.samples.append(round((current - self.last) /
+                                  (now - self.last_at)))
+        self.last_at = now
+        self.last = current
+
+    async def stop(self) -> dict:
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        if time.monotonic() - self.last_at >= POLL_INTERVAL:
+            self._sample()
+        messages = self.broker.stats["messages_in"] - self.first
+        return {
+            "messages": messages,
+            "peak_msgs_per_s": max(self.samples, default=0),
+            "mean_msgs_per_s": round(messages /
+                                     (time.monotonic() - self.started), 1)
+        }
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(RATE_SAMPLE_INTERVAL)
+            self._sample()
+
+
+class Fleet:
+    def __init__(self, args, broker: MQTTBroker):
+        self.args = args
+        self.broker = broker
+        self.message_bus = None
+        self.workers = []
+        self.state_tasks = []
+
+    def start(self):
+        from workers.config import Config
+        from workers.message_bus import MessageBus
+        from workers.mqtt_worker import MQTTWorker
+        from workers.displays import load_displays
+
+        config = Config.from_env()
+        displays = load_displays(config)
+        self.message_bus = MessageBus()
+        self.message_bus.start()
+
+        for index in range(self.args.devices):
+            mac = f"02:00:00:{index >> 16 & 0xff:02x}:" \
+                  f"{index >> 8 & 0xff:02x}:{index & 0xff:02x}"
+            worker = MQTTWorker(f"kiosk-sim{index:05d}", mac,
+                                self.message_bus, displays, config)
+            worker.start()
+            self.workers.append(worker)
+            self.state_tasks.append(asyncio.create_task(
+                self._state_pattern(worker)))
+
+    async def stop(self):
+        for task in self.state_tasks:
+            task.cancel()
+        await asyncio.gather(*self.state_tasks, return_exceptions=True)
+        await asyncio.gather(*(worker.stop() for worker in self.workers))
+        self.message_bus.stop()
+        await self.message_bus.wait_closed()
+
+    async def _state_pattern(self, worker):
+        values = {f"sim_{index}": random.uniform(0, 100)
+                  for index in range(self.args.sensors)}
+        await asyncio.sleep(random.uniform(0, self.args.state_interval))
+        while True:
+            for sensor in values:
+                values[sensor] += random.gauss(0, self.args.state_noise)
+            worker.push_command({"command": "sensors_push",
+                                 "arg": {sensor: round(value, 1)
+                                         for sensor, value in values.items()}})
+            await asyncio.sleep(self.args.state_interval)
+
+    def connected(self, reconnect: bool = True) -> int:
+        connected = sum(worker.mqtt_client.is_connected()
+                        for worker in self.workers)
+        if reconnect:
+            return min(connected, self.broker.stats["connects"])
+        return connected
+
+    def recovered(self, republished: bool) -> int:
+        if republished:
+            return sum(1 for topic, count in self.broker.topic_counts.items()
+                       if topic.endswith(CONFIG_SUFFIX) and count)
+        return sum(1 for topic, count in self.broker.topic_counts.items()
+                   if topic.endswith(AVAILABILITY_SUFFIX) and count and
+                   self.broker.retained.get(topic) == b"online")
+
+    async def converge(self, started: float, republished: bool = True,
+                       reconnect: bool = True) -> dict:
+        result = {"connected_s": None, "recovered_s": None}
+        deadline = started + self.args.converge_timeout
+        while time.monotonic() < deadline:
+            now = time.monotonic()
+            if result["connected_s"] is None and \
+                    self.connected(reconnect) == len(self.workers):
+                result["connected_s"] = round(now - started, 3)
+            if result["recovered_s"] is None and \
+                    self.recovered(republished) == len(self.workers):
+                result["recovered_s"] = round(now - started, 3)
+            if None not in result.values():
+                break
+            await asyncio.sleep(POLL_INTERVAL)
+        result["connected"] = self.connected(reconnect)
+        result["recovered"] = self.recovered(republished)
+        result["recovered_by"] = "discovery" if republished else "availability"
+        return result
+
+
+async def storm(args, broker: MQTTBroker, fleet: Fleet) -> dict:
+    sampler = RateSampler(broker)
+    broker.reset_stats()
+    sampler.start()
+
+    match args.storm:
+        case "broker":
+            await broker.stop()
+            await asyncio.sleep(args.outage)
+            await broker.start()
+        case "network":
+            broker.drop_clients()
+        case "ha":
+            broker.publish(HA_STATUS_TOPIC, b"offline")
+            await asyncio.sleep(args.outage)
+            broker.publish(HA_STATUS_TOPIC, b"online")
+
+    result = await fleet.converge(time.monotonic(), args.storm == "ha",
+                                  args.storm != "ha")
+
+    result.update(await sampler.stop())
+    result["bytes"] = broker.stats["bytes_in"]
+    result["connects"] = broker.stats["connects"]
+    return result
+
+
+async def run(args) -> dict:
+    broker = MQTTBroker()
+    await broker.start()
+
+    os.environ["MQTT_HOST"] = broker.host
+    os.environ["MQTT_PORT"] = str(broker.port)
+    os.environ.setdefault("MQTT_STATE_HEARTBEAT", "0")
+    os.environ.setdefault("IFNAME", "lo")
+    os.environ.setdefault("HA_URL", "http://homeassistant.local:8123")
+
+    fleet = Fleet(args, broker)
+    sampler = RateSampler(broker)
+    sampler.start()
+    started = time.monotonic()
+    fleet.start()
+
+    report = {"devices": args.devices, "storm": args.storm}
+    report["startup"] = await fleet.converge(started)
+    report["startup"].update(await sampler.stop())
+
+    broker.reset_stats()
+    sampler.start()
+    await asyncio.sleep(args.settle)
+    steady = await sampler.stop()
+    steady["msgs_per_device_per_min"] = round(
+        broker.stats["messages_in"] / args.devices / args.settle * 60, 2)
+    report["steady"] = steady
+
+    report["storms"] = []
+    for _ in range(args.storms):
+        report["storms"].append(await storm(args, broker, fleet))
+        await asyncio.sleep(args.settle)
+
+    await fleet.stop()
+    await broker.stop()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Simulates a fleet of kiosk MQTT devices against an "
+                    "in-process broker and measures reconnect storms")
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--sensors", type=int, default=6)
+    parser.add_argument("--state-interval", type=float, default=10)
+    parser.add_argument("--state-noise", type=float, default=1)
+    parser.add_argument("--storm", choices=["broker", "network", "ha"],
+                        default="broker")
+    parser.add_argument("--storms", type=int, default=3)
+    parser.add_argument("--outage", type=float, default=2)
+    parser.add_argument("--settle", type=float, default=15)
+    parser.add_argument("--converge-timeout", type=float, default=60)
+    parser.add_argument("--max-converge-s", type=float, default=None)
+    parser.add_argument("--log-level", default="ERROR")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper())
+    raise_fd_limit()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+
+    failed = []
+    for index, result in enumerate([report["startup"]] + report["storms"]):
+        if result["recovered_s"] is None:
+            failed.append(f"run {index}: only {result["recovered"]} of "
+                          f"{args.devices} devices recovered "
+                          f"({result["recovered_by"]})")
+        elif args.max_converge_s is not None and \
+                result["recovered_s"] > args.max_converge_s:
+            failed.append(f"run {index}: converged in "
+                          f"{result["recovered_s"]} s > {args.max_converge_s} s")
+
+    for reason in failed:
+        print(f"FAIL: {reason}", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+from bench.fakes import (
+    BenchMessageBus,
+    FakeBacklight,
+    FakeChromeWorker,
+    FakeNetworkMonitor,
+    FakeUIWorker
+)
+from bench.mqtt_broker import MQTTBroker
+
+UNIQUE_ID = "kiosk-bench0"
+MAC_ADDR = "02:00:00:00:00:00"
+READY_TIMEOUT = 10
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def usage() -> dict:
+    rusage = resource.getrusage(resource.RUSAGE_SELF)
+    return {
+        "cpu": rusage.ru_utime + rusage.ru_stime,
+        "wakeups": rusage.ru_nvcsw + rusage.ru_nivcsw,
+        "time": time.monotonic()
+    }
+
+
+def usage_delta(start: dict) -> dict:
+    end = usage()
+    duration = end["time"] - start["time"]
+    return {
+        "duration": round(duration, 3),
+        "cpu_time": round(end["cpu"] - start["cpu"], 4),
+        "wakeups": end["wakeups"] - start["wakeups"],
+        "wakeups_per_s": round((end["wakeups"] - start["wakeups"]) / duration, 1)
+    }
+
+
+async def wait_for(condition, timeout: float):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("pipeline did not become ready")
+        await asyncio.sleep(0.01)
+
+
+async def run(args) -> dict:
+    broker = MQTTBroker()
+    await broker.start()
+
+    os.environ["MQTT_HOST"] = broker.host
+    os.environ["MQTT_PORT"] = str(broker.port)
+    os.environ.setdefault("WINDOW_SIZE", "1280,720")
+    os.environ.setdefault("IFNAME", "lo")
+    os.environ.setdefault("HA_URL", "http://homeassistant.local:8123")
+
+    from workers.kiosk_worker import UICompositor
+    from workers.mqtt_worker import MQTTWorker
+    from workers.system_worker import SystemWorker
+
+    message_bus = BenchMessageBus()
+    ui_compositor = UICompositor(tempfile.gettempdir(), UNIQUE_ID, message_bus)
+    ui_compositor.ui_worker = FakeUIWorker()
+    ui_compositor.chrome_worker = FakeChromeWorker(message_bus,
+                                                   args.browser_round_trip)
+    system_worker = SystemWorker(message_bus,
+                                 network_monitor=FakeNetworkMonitor(message_bus),
+                                 brightness_target=FakeBacklight())
+    mqtt_worker = MQTTWorker(UNIQUE_ID, MAC_ADDR, message_bus)
+
+    async def shutdown(message):
+        await system_worker.stop()
+        await mqtt_worker.stop()
+        message_bus.stop()
+
+    message_bus.subscribe(UICompositor.HANDLED_COMMANDS,
+                          ui_compositor.push_command)
+    message_bus.subscribe(SystemWorker.HANDLED_COMMANDS,
+                          system_worker.push_command)
+    message_bus.subscribe(MQTTWorker.HANDLED_COMMANDS,
+                          mqtt_worker.push_command)
+    message_bus.subscribe(["exit"], shutdown)
+
+    message_bus.start()
+    mqtt_worker.start()
+    system_worker.start()
+
+    await wait_for(lambda: mqtt_worker.mqtt_client.is_connected()
+                   and ui_compositor.ifstate, READY_TIMEOUT)
+    await asyncio.sleep(args.settle)
+
+    broker.reset_stats()
+    idle = usage()
+    await asyncio.sleep(args.idle)
+    idle_usage = usage_delta(idle)
+    idle_publishes = broker.topic_counts[mqtt_worker.STATE_TOPIC]
+
+    broker.reset_stats()
+    sent = {}
+    bench_id = 0
+    burst = usage()
+    for _ in range(args.bursts):
+        burst_ids = []
+        for _ in range(args.burst_size):
+            bench_id += 1
+            command = random.choice(args.commands)
+            message = {"command": command, "bench_id": bench_id}
+            if command == "set_brightness":
+                message["arg"] = random.randint(0, 100)
+            elif command == "screen_power":
+                message["arg"] = random.choice(["ON", "OFF"])
+            sent[bench_id] = time.monotonic()
+            burst_ids.append(bench_id)
+            broker.publish(mqtt_worker.COMMAND_TOPIC,
+                           json.dumps(message).encode())
+
+        try:
+            await wait_for(lambda: all(sent_id in message_bus.handled
+                                       for sent_id in burst_ids),
+                           args.burst_timeout)
+        except TimeoutError:
+            logging.getLogger("bench").warning("burst did not complete")
+        await asyncio.sleep(args.interval)
+    burst_usage = usage_delta(burst)
+
+    latencies = [(message_bus.handled[sent_id] - sent_at) * 1000
+                 for sent_id, sent_at in sent.items()
+                 if sent_id in message_bus.handled]
+    state_publishes = broker.topic_counts[mqtt_worker.STATE_TOPIC]
+
+    broker.publish(mqtt_worker.COMMAND_TOPIC, b'{"command": "exit"}')
+    await asyncio.wait_for(message_bus.wait_closed(), READY_TIMEOUT)
+    await broker.stop()
+
+    return {
+        "commands": {
+            "sent": len(sent),
+            "handled": len(latencies),
+            "dropped": len(sent) - len(latencies),
+            "p50_ms": round(percentile(latencies, 0.5), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "max_ms": round(max(latencies, default=0), 2)
+        },
+        "bus_latency_ms": {
+            command: {key: round(value * 1000, 2) if key != "count" else value
+                      for key, value in stats.items()}
+            for command, stats in message_bus.latency_stats().items()
+        },
+        "state_publishes": {
+            "idle": idle_publishes,
+            "idle_per_s": round(idle_publishes / idle_usage["duration"], 2),
+            "burst": state_publishes,
+            "burst_per_s": round(state_publishes / burst_usage["duration"], 2)
+        },
+        "idle": idle_usage,
+        "burst": burst_usage
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Command latency benchmark for the kiosk dispatch "
+                    "pipeline against an in-process MQTT broker")
+    parser.add_argument("--bursts", type=int, default=20)
+    parser.add_argument("--burst-size", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=0.2)
+    parser.add_argument("--idle", type=float, default=5)
+    parser.add_argument("--settle", type=float, default=1)
+    parser.add_argument("--burst-timeout", type=float, default=5)
+    parser.add_argument("--browser-round-trip", type=float, default=0.002)
+    parser.add_argument("--commands", nargs="+",
+                        default=["reload", "set_brightness"])
+    parser.add_argument("--max-p99-ms", type=float, default=None)
+    parser.add_argument("--max-idle-wakeups", type=float, default=None)
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper())
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+
+    failed = []
+    if report["commands"]["dropped"]:
+        failed.append(f"{report["commands"]["dropped"]} commands not handled")
+    if args.max_p99_ms is not None and report["commands"]["p99_ms"] > args.max_p99_ms:
+        failed.append(f"p99 {report["commands"]["p99_ms"]} ms > {args.max_p99_ms} ms")
+    if args.max_idle_wakeups is not None and \
+            report["idle"]["wakeups_per_s"] > args.max_idle_wakeups:
+        failed.append(f"idle wakeups {report["idle"]["wakeups_per_s"]}/s > "
+                      f"{args.max_idle_wakeups}/s")
+
+    for reason in failed:
+        print(f"FAIL: {reason}", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+import asyncio
+import logging
+import struct
+import time
+from collections import Counter
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+
+def encode_length(length: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        encoded.append(byte)
+        if not length:
+            return bytes(encoded)
+
+
+def encode_string(value: str | bytes) -> bytes:
+    if isinstance(value, str):
+        value = value.encode()
+    return struct.pack("!H", len(value)) + value
+
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    pattern_parts = pattern.split("/")
+    topic_parts = topic.split("/")
+    for index, part in enumerate(pattern_parts):
+        if part == "#":
+            return True
+        if index >= len(topic_parts):
+            return False
+        if part != "+" and part != topic_parts[index]:
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+class PacketReader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offset = 0
+
+    def remaining(self) -> bytes:
+        return self.data[self.offset:]
+
+    def byte(self) -> int:
+        self.offset += 1
+        return self.data[self.offset - 1]
+
+    def uint16(self) -> int:
+        self.offset += 2
+        return struct.unpack_from("!H", self.data, self.offset - 2)[0]
+
+    def binary(self) -> bytes:
+        length = self.uint16()
+        self.offset += length
+        return self.data[self.offset - length:self.offset]
+
+    def string(self) -> str:
+        return self.binary().decode()
+
+    def varint(self) -> int:
+        value = 0
+        multiplier = 1
+        while True:
+            byte = self.byte()
+            value += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                return value
+            multiplier *= 128
+
+    def skip_properties(self):
+        length = self.varint()
+        self.offset += length
+
+
+class BrokerClient:
+    def __init__(self, broker, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter):
+        self.broker = broker
+        self.reader = reader
+        self.writer = writer
+        self.client_id = None
+        self.protocol = 4
+        self.subscriptions = set()
+        self.will = None
+
+    def send(self, packet_type: int, flags: int, body: bytes):
+        self.writer.write(bytes([(packet_type << 4) | flags]) +
+                          encode_length(len(body)) + body)
+        self.broker.stats["bytes_out"] += len(body) + 2
+
+    def send_publish(self, topic: str, payload: bytes, retain: bool):
+        body = encode_string(topic)
+        if self.protocol == 5:
+            body += b"\x00"
+        self.send(PUBLISH, 0x01 if retain else 0x00, body + payload)
+        self.broker.stats["messages_out"] += 1
+
+    async def read_packet(self):
+        header = await self.reader.readexactly(1)
+        length = 0
+        multiplier = 1
+        while True:
+            byte = (await self.reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        body = await self.reader.readexactly(length) if length else b""
+        self.broker.stats["bytes_in"] += length + 2
+        return header[0] >> 4, header[0] & 0x0F, body
+
+    def handle_connect(self, body: bytes):
+        packet = PacketReader(body)
+        packet.string()
+        self.protocol = packet.byte()
+        flags = packet.byte()
+        packet.uint16()
+        if self.protocol == 5:
+            packet.skip_properties()
+        self.client_id = packet.string()
+
+        if flags & 0x04:
+            if self.protocol == 5:
+                packet.skip_properties()
+            self.will = (packet.string(), packet.binary(), bool(flags & 0x20))
+
+        self.broker.register(self)
+        if self.protocol == 5:
+            self.send(CONNACK, 0, b"\x00\x00\x00")
+        else:
+            self.send(CONNACK, 0, b"\x00\x00")
+
+    def handle_publish(self, flags: int, body: bytes):
+        packet = PacketReader(body)
+        topic = packet.string()
+        qos = (flags >> 1) & 0x03
+        packet_id = packet.uint16() if qos else None
+        if self.protocol == 5:
+            packet.skip_properties()
+
+        self.broker.publish(topic, packet.remaining(), bool(flags & 0x01),
+                            counted=True)
+        if qos == 1:
+            self.send(PUBACK, 0, struct.pack("!H", packet_id))
+
+    def handle_subscribe(self, body: bytes):
+        packet = PacketReader(body)
+        packet_id = packet.uint16()
+        if self.protocol == 5:
+            packet.skip_properties()
+
+        topics = []
+        while packet.offset < len(body):
+            topics.append(packet.string())
+            packet.byte()
+
+        response = struct.pack("!H", packet_id)
+        if self.protocol == 5:
+            response += b"\x00"
+        self.send(SUBACK, 0, response + bytes(len(topics)))
+
+        for topic in topics:
+            self.subscriptions.add(topic)
+            self.broker.deliver_retained(self, topic)
+
+    def handle_unsubscribe(self, body: bytes):
+        packet = PacketReader(body)
+        packet_id = packet.uint16()
+        if self.protocol == 5:
+            packet.skip_properties()
+
+        count = 0
+        while packet.offset < len(body):
+            self.subscriptions.discard(packet.string())
+            count += 1
+
+        response = struct.pack("!H", packet_id)
+        if self.protocol == 5:
+            response += b"\x00" + bytes(count)
+        self.send(UNSUBACK, 0, response)
+
+    async def run(self):
+        clean = False
+        try:
+            while True:
+                packet_type, flags, body = await self.read_packet()
+                if packet_type == CONNECT:
+                    self.handle_connect(body)
+                elif packet_type == PUBLISH:
+                    self.handle_publish(flags, body)
+                elif packet_type == SUBSCRIBE:
+                    self.handle_subscribe(body)
+                elif packet_type == UNSUBSCRIBE:
+                    self.handle_unsubscribe(body)
+                elif packet_type == PINGREQ:
+                    self.send(PINGRESP, 0, b"")
+                elif packet_type == DISCONNECT:
+                    clean = True
+                    break
+                await self.writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.broker.unregister(self)
+            if not clean and self.will is not None:
+                self.broker.publish(*self.will, counted=True)
+            self.writer.close()
+
+
+class MQTTBroker:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._logger = logging.getLogger("MQTTBroker")
+
+        self.host = host
+        self.port = port
+        self.server = None
+        self.clients = {}
+        self.retained = {}
+        self.stats = Counter()
+        self.topic_counts = Counter()
+        self.listeners = []
+        self.started = time.monotonic()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._on_client,
+                                                 self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self._logger.info("listening on %s:%d", self.host, self.port)
+
+    def drop_clients(self):
+        for client in list(self.clients.values()):
+            client.writer.close()
+
+    async def stop(self):
+        self.server.close()
+        for client in list(self.clients.values()):
+            client.writer.close()
+        await self.server.wait_closed()
+        self.clients = {}
+
+    def reset_stats(self):
+        self.stats = Counter()
+        self.topic_counts = Counter()
+        self.started = time.monotonic()
+
+    async def _on_client(self, reader: asyncio.StreamReader,
+                         writer: asyncio.StreamWriter):
+        await BrokerClient(self, reader, writer).run()
+
+    def register(self, client: BrokerClient):
+        previous = self.clients.get(client.client_id)
+        if previous is not None and previous is not client:
+            previous.writer.close()
+        self.clients[client.client_id] = client
+        self.stats["connects"] += 1
+
+    def unregister(self, client: BrokerClient):
+        if self.clients.get(client.client_id) is client:
+            del self.clients[client.client_id]
+        self.stats["disconnects"] += 1
+
+    def publish(self, topic: str, payload: bytes, retain: bool = False,
+                counted: bool = False):
+        self.stats["messages_in"] += 1
+        if not counted:
+            self.stats["bytes_injected"] += len(payload)
+        self.topic_counts[topic] += 1
+
+        if retain:
+            if payload:
+                self.retained[topic] = payload
+            else:
+                self.retained.pop(topic, None)
+
+        for listener in self.listeners:
+            listener(topic, payload)
+
+        for client in list(self.clients.values()):
+            if any(topic_matches(pattern, topic)
+                   for pattern in client.subscriptions):
+                client.send_publish(topic, payload, False)
+
+    def deliver_retained(self, client: BrokerClient, pattern: str):
+        for topic, payload in self.retained.items():
+            if topic_matches(pattern, topic):
+                client.send_publish(topic, payload, True)
+
+    def message_rate(self) -> float:
+        return self.stats["messages_in"] / max(time.monotonic() - self.started,
+                                               1e-6)
@@ -1 +1 @@
-AVAILABLE_COMMANDS = ["reload", "reboot", "set_brightness", "exit"]
\ No newline at end of file
+AVAILABLE_COMMANDS = ["reload", "navigate", "reboot", "set_brightness", "screen_power", "dump_logs", "exit"]
\ No newline at end of file
@@ -0,0 +1,18 @@
+SOFTWARE = ["--disable-gpu", "--disable-gpu-compositing"]
+FOREGROUND = ["--disable-background-timer-throttling",
+              "--disable-renderer-backgrounding",
+              "--disable-backgrounding-occluded-windows"]
+
+CHROME_PROFILES = {
+    "default": [],
+    "gpu": ["--ignore-gpu-blocklist", "--enable-gpu-rasterization",
+            "--enable-zero-copy"],
+    "software": SOFTWARE,
+    "software_raster1": SOFTWARE + ["--num-raster-threads=1"],
+    "software_raster2": SOFTWARE + ["--num-raster-threads=2"],
+    "software_raster4": SOFTWARE + ["--num-raster-threads=4"],
+    "software_lean": SOFTWARE + ["--num-raster-threads=2",
+                                 "--renderer-process-limit=2",
+                                 "--disable-smooth-scrolling"],
+    "software_foreground": SOFTWARE + ["--num-raster-threads=2"] + FOREGROUND,
+}
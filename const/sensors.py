@@ -15,6 +15,203 @@ HA_ENTITIES = {
         "entity_category": "diagnostic",
         "value_template": '{{ value_json.uptime }}',
     },
+    "dashboard_recovery": {
+        "name": "Dashboard recovery time",
+        "unit_of_measurement": "s",
+        "device_class": "duration",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.dashboard_recovery }}',
+    },
+    "first_paint": {
+        "name": "Boot to first paint",
+        "unit_of_measurement": "s",
+        "device_class": "duration",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.first_paint }}',
+    },
+    "boot_to_dashboard": {
+        "name": "Boot to dashboard",
+        "unit_of_measurement": "s",
+        "device_class": "duration",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.boot_to_dashboard }}',
+    },
+    "queue_depth": {
+        "name": "Queue depth",
+        "icon": "mdi:tray-full",
+        "state_class": "measurement",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.queue_depth }}',
+    },
+    "queue_high_water": {
+        "name": "Queue high-water mark",
+        "icon": "mdi:tray-full",
+        "state_class": "measurement",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.queue_high_water }}',
+        "json_attributes_template": '{{ value_json.queues | tojson }}',
+    },
+    "dropped_commands": {
+        "name": "Dropped commands",
+        "icon": "mdi:tray-remove",
+        "state_class": "total_increasing",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.dropped_commands }}',
+        "json_attributes_template": '{{ value_json.queues | tojson }}',
+    },
+    "command_latency": {
+        "name": "Command latency (p99)",
+        "unit_of_measurement": "ms",
+        "device_class": "duration",
+        "state_class": "measurement",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.command_latency }}',
+    },
+    "loop_lag": {
+        "name": "Event loop lag",
+        "unit_of_measurement": "ms",
+        "device_class": "duration",
+        "state_class": "measurement",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.loop_lag }}',
+    },
+    "mqtt_publishes": {
+        "name": "MQTT state publishes",
+        "icon": "mdi:upload-network",
+        "state_class": "total_increasing",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.mqtt_publishes }}',
+    },
+    "process_rss": {
+        "name": "Kiosk memory",
+        "unit_of_measurement": "MB",
+        "device_class": "data_size",
+        "state_class": "measurement",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.process_rss }}',
+    },
+    "process_cpu": {
+        "name": "Kiosk CPU",
+        "icon": "mdi:cpu-64-bit",
+        "unit_of_measurement": "%",
+        "state_class": "measurement",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.process_cpu }}',
+    },
+    "browser_rss": {
+        "name": "Browser memory",
+        "unit_of_measurement": "MB",
+        "device_class": "data_size",
+        "state_class": "measurement",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.browser_rss }}',
+    },
+    "browser_cpu": {
+        "name": "Browser CPU",
+        "icon": "mdi:google-chrome",
+        "unit_of_measurement": "%",
+        "state_class": "measurement",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.browser_cpu }}',
+    },
+    "browser_restarts": {
+        "name": "Browser restarts",
+        "icon": "mdi:restart",
+        "state_class": "total_increasing",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.browser_restarts }}',
+    },
+    "page_load": {
+        "name": "Dashboard load time",
+        "unit_of_measurement": "s",
+        "device_class": "duration",
+        "state_class": "measurement",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.page_load }}',
+    },
+    "long_tasks": {
+        "name": "Long tasks",
+        "icon": "mdi:timer-sand",
+        "state_class": "measurement",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.long_tasks }}',
+    },
+    "long_task_time": {
+        "name": "Long task time",
+        "unit_of_measurement": "ms",
+        "device_class": "duration",
+        "state_class": "measurement",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.long_task_time }}',
+    },
+    "jank_frames": {
+        "name": "Janky frames",
+        "icon": "mdi:filmstrip-box",
+        "state_class": "measurement",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.jank_frames }}',
+    },
+    "page_fps": {
+        "name": "Dashboard frame rate",
+        "icon": "mdi:speedometer",
+        "unit_of_measurement": "fps",
+        "state_class": "measurement",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.page_fps }}',
+    },
+    "js_heap": {
+        "name": "Dashboard JS heap",
+        "unit_of_measurement": "MB",
+        "device_class": "data_size",
+        "state_class": "measurement",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.js_heap }}',
+    },
+    "ws_reconnects": {
+        "name": "HA websocket reconnects",
+        "icon": "mdi:lan-disconnect",
+        "state_class": "total_increasing",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.ws_reconnects }}',
+    },
+    "recovery_time": {
+        "name": "Mean time to recovery",
+        "unit_of_measurement": "s",
+        "device_class": "duration",
+        "state_class": "measurement",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.recovery_time }}',
+    },
+    "recoveries": {
+        "name": "Watchdog recoveries",
+        "icon": "mdi:lifebuoy",
+        "state_class": "total_increasing",
+        "platform": "sensor",
+        "entity_category": "diagnostic",
+        "value_template": '{{ value_json.recoveries }}',
+    },
     "reboot": {
         "name": "Reboot",
         "device_class": "restart",
@@ -22,6 +219,13 @@ HA_ENTITIES = {
         "platform": "button",
         "payload_press": '{"command": "reboot"}'
     },
+    "dump_logs": {
+        "name": "Dump debug logs",
+        "icon": "mdi:text-box-search",
+        "entity_category": "diagnostic",
+        "platform": "button",
+        "payload_press": '{"command": "dump_logs"}'
+    },
     "restart": {
         "name": "Reload page",
         "device_class": "restart",
@@ -29,6 +233,30 @@ HA_ENTITIES = {
         "platform": "button",
         "payload_press": '{"command": "reload"}'
     },
+    "dashboard": {
+        "name": "Dashboard",
+        "icon": "mdi:view-dashboard",
+        "platform": "select",
+        "options": [],
+        "command_template": '{"command": "navigate", "arg": "{{ value }}"}',
+        "value_template": '{{ value_json.dashboard }}',
+    },
+    "screenshot": {
+        "name": "Screen capture",
+        "platform": "camera",
+        "entity_category": "diagnostic",
+        "topic": "",
+    },
+    "screen_power": {
+        "name": "Screen",
+        "icon": "mdi:monitor",
+        "platform": "switch",
+        "payload_on": '{"command": "screen_power", "arg": "ON"}',
+        "payload_off": '{"command": "screen_power", "arg": "OFF"}',
+        "state_on": "ON",
+        "state_off": "OFF",
+        "value_template": '{{ value_json.screen_power }}',
+    },
     "brightness": {
         "name": "Screen brightness",
         "icon": "mdi:brightness-7",
@@ -40,3 +268,105 @@ HA_ENTITIES = {
         "platform": "number"
     }
 }
+
+SENSOR_OPTIONS = {
+    "cputemp": {
+        "deadband": 0.5,
+        "interval": 10,
+    },
+    "uptime": {
+        "deadband": 60,
+        "interval": 60,
+    },
+    "brightness": {
+        "deadband": 0,
+        "interval": 5,
+    },
+    "screen_power": {
+        "deadband": 0,
+    },
+    "dashboard": {
+        "deadband": 0,
+    },
+    "dashboard_recovery": {
+        "deadband": 0,
+    },
+    "first_paint": {
+        "deadband": 0,
+    },
+    "boot_to_dashboard": {
+        "deadband": 0,
+    },
+    "queue_depth": {
+        "deadband": 1,
+    },
+    "queue_high_water": {
+        "deadband": 0,
+    },
+    "dropped_commands": {
+        "deadband": 0,
+    },
+    "command_latency": {
+        "deadband": 5,
+    },
+    "loop_lag": {
+        "deadband": 5,
+    },
+    "mqtt_publishes": {
+        "deadband": 0,
+    },
+    "process_rss": {
+        "deadband": 1,
+    },
+    "process_cpu": {
+        "deadband": 2,
+    },
+    "browser_rss": {
+        "deadband": 5,
+    },
+    "browser_cpu": {
+        "deadband": 5,
+    },
+    "browser_restarts": {
+        "deadband": 0,
+    },
+    "page_load": {
+        "deadband": 0.1,
+    },
+    "long_tasks": {
+        "deadband": 1,
+    },
+    "long_task_time": {
+        "deadband": 50,
+    },
+    "jank_frames": {
+        "deadband": 1,
+    },
+    "page_fps": {
+        "deadband": 2,
+    },
+    "js_heap": {
+        "deadband": 2,
+    },
+    "ws_reconnects": {
+        "deadband": 0,
+    },
+    "recovery_time": {
+        "deadband": 0,
+    },
+    "recoveries": {
+        "deadband": 0,
+    }
+}
+
+DISPLAY_ENTITIES = [
+    "dashboard_recovery", "first_paint", "boot_to_dashboard",
+    "browser_rss", "browser_cpu", "browser_restarts",
+    "page_load", "long_tasks", "long_task_time", "jank_frames", "page_fps",
+    "js_heap", "ws_reconnects",
+    "restart", "screen_power", "brightness", "dashboard",
+    "screenshot"
+]
+
+DISPLAY_PAYLOADS = ["payload_press", "payload_on", "payload_off",
+                    "command_template"]
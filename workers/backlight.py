@@ -0,0 +1,163 @@
+import asyncio
+import os
+import time
+import logging
+
+from workers.sysfs import SysfsReader
+
+BACKLIGHT_ROOT = "/sys/class/backlight"
+FADE_DURATION = 0.4
+FADE_STEP_INTERVAL = 0.02
+BL_POWER_ON = 0
+BL_POWER_OFF = 4
+
+
+class Backlight:
+    def __init__(self, device: str):
+        self._logger = logging.getLogger("Backlight")
+
+        self.device = device
+        self.path = os.path.join(BACKLIGHT_ROOT, device)
+
+        max_reader = SysfsReader(os.path.join(self.path, "max_brightness"))
+        self.max_brightness = max_reader.read_int()
+        max_reader.close()
+
+        self.brightness_reader = SysfsReader(
+            os.path.join(self.path, "brightness"))
+        self.brightness_fd = os.open(os.path.join(self.path, "brightness"),
+                                     os.O_WRONLY)
+
+        self.power_fd = None
+        self.power = True
+
+        self.fade_task = None
+        self.fade_from = 0
+        self.fade_to = 0
+        self.fade_started = 0
+
+        self._logger.info("using %s, max brightness %d",
+                          self.path, self.max_brightness)
+
+    @classmethod
+    def discover(cls, device: str | None = None):
+        if device is None:
+            try:
+                devices = sorted(os.listdir(BACKLIGHT_ROOT))
+            except OSError:
+                return None
+            if not devices:
+                return None
+            device = devices[0]
+
+        try:
+            return cls(device)
+        except OSError:
+            logging.getLogger("Backlight").warning(
+                "backlight %s is not accessible", device, exc_info=True)
+            return None
+
+    def _read_raw(self) -> int:
+        return self.brightness_reader.read_int()
+
+    def _write_raw(self, value: int):
+        os.pwrite(self.brightness_fd, f"{value}\n".encode(), 0)
+
+    def get_brightness(self) -> int:
+        return round(self._read_raw() * 100 / self.max_brightness)
+
+    def set_brightness(self, value: int):
+        self.fade_from = self._read_raw()
+        self.fade_to = round(value * self.max_brightness / 100)
+        self.fade_started = time.monotonic()
+
+        if self.fade_task is None or self.fade_task.done():
+            self.fade_task = asyncio.create_task(self._fade(),
+                                                 name="backlight_fade")
+
+    def get_power(self) -> bool:
+        return self.power
+
+    def set_power(self, on: bool):
+        if self.power_fd is None:
+            self.power_fd = os.open(os.path.join(self.path, "bl_power"),
+                                    os.O_WRONLY)
+        value = BL_POWER_ON if on else BL_POWER_OFF
+        os.pwrite(self.power_fd, f"{value}\n".encode(), 0)
+        self.power = on
+
+    async def _fade(self):
+        current = self.fade_from
+        while True:
+            progress = min(1, (time.monotonic() - self.fade_started) /
+                           FADE_DURATION)
+            value = round(self.fade_from +
+                          (self.fade_to - self.fade_from) * progress)
+            if value != current:
+                try:
+                    self._write_raw(value)
+                except OSError:
+                    self._logger.warning("cannot set brightness of %s",
+                                         self.device, exc_info=True)
+                    return
+                current = value
+            if progress >= 1:
+                break
+            await asyncio.sleep(FADE_STEP_INTERVAL)
+
+
+class SbcBacklight:
+    def __init__(self, display):
+        self._logger = logging.getLogger("SbcBacklight")
+
+        self.display = display
+        self.brightness = int(display.get_brightness())
+        self.set_task = None
+        self.pending_value = None
+        self.power = True
+        self.restore_brightness = self.brightness
+
+    @classmethod
+    def discover(cls):
+        import screen_brightness_control as sbc
+
+        logging.getLogger('screen_brightness_control').setLevel(logging.FATAL)
+        monitors = [monitor for monitor in sbc.list_monitors_info(
+        ) if monitor["method"] is not sbc.linux.XRandr]
+        if len(monitors) == 0:
+            return None
+        return cls(sbc.Display.from_dict(monitors[0]))
+
+    def get_brightness(self) -> int:
+        return self.brightness
+
+    def set_brightness(self, value: int):
+        self.pending_value = value
+        if self.set_task is None or self.set_task.done():
+            self.set_task = asyncio.create_task(self._apply(),
+                                                name="sbc_brightness")
+
+    def get_power(self) -> bool:
+        return self.power
+
+    def set_power(self, on: bool):
+        if on == self.power:
+            return
+        if not on:
+            self.restore_brightness = self.pending_value or self.brightness
+        self.power = on
+        self.set_brightness(self.restore_brightness if on else 0)
+
+    async def _apply(self):
+        loop = asyncio.get_running_loop()
+        while self.pending_value is not None:
+            value = self.pending_value
+            self.pending_value = None
+            try:
+                await loop.run_in_executor(None, self.display.set_brightness,
+                                           value)
+            except Exception:
+                self._logger.warning("cannot set brightness to %d", value,
+                                     exc_info=True)
+                continue
+            self.brightness = value
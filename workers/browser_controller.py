@@ -0,0 +1,211 @@
+import asyncio
+import logging
+from collections import OrderedDict
+
+from workers.cdp import CDPSession, CDPError, COMMAND_TIMEOUT
+
+BACKGROUND_CPU_THROTTLE = 20
+
+
+class BrowserController:
+    def __init__(self, debugger_address: str, pool_size: int = 0):
+        self._logger = logging.getLogger("BrowserController")
+
+        self.cdp = CDPSession(debugger_address)
+        self.pool_size = pool_size
+        self.ha_target = None
+        self.ha_session = None
+        self.active_target = None
+        self.sessions = {}
+        self.tabs = OrderedDict()
+        self.scripts = []
+        self.performance = False
+        self.tab_lock = asyncio.Lock()
+        self.allowed_targets = set()
+        self.throttled = False
+
+    @property
+    def active_session(self) -> str:
+        return self.sessions[self.active_target]
+
+    async def connect(self, ha_target: str, ha_url: str):
+        self.ha_target = ha_target
+        self.allowed_targets = {ha_target}
+
+        self.cdp.on("Target.targetCreated", self._on_target_created)
+
+        await self.cdp.connect()
+        await self.cdp.send("Target.setDiscoverTargets", {"discover": True})
+
+        self.ha_session = await self._attach(ha_target)
+        self.active_target = ha_target
+        self.tabs[ha_url] = ha_target
+
+        self._logger.info("attached to dashboard target %s", ha_target)
+
+    async def close(self):
+        await self.cdp.close()
+
+    def is_connected(self) -> bool:
+        return self.cdp.is_connected()
+
+    async def _attach(self, target: str) -> str:
+        result = await self.cdp.send("Target.attachToTarget",
+                                     {"targetId": target, "flatten": True})
+        session = result["sessionId"]
+        self.sessions[target] = session
+        await self.cdp.send("Page.enable", session_id=session)
+        for source in self.scripts:
+            await self.cdp.send("Page.addScriptToEvaluateOnNewDocument",
+                                {"source": source}, session_id=session)
+        if self.performance:
+            await self.cdp.send("Performance.enable", session_id=session)
+        return session
+
+    async def _on_target_created(self, params: dict, session_id):
+        target = params["targetInfo"]
+        if target["type"] != "page":
+            return
+        async with self.tab_lock:
+            if target["targetId"] in self.allowed_targets:
+                return
+
+        self._logger.info("closing stray tab %s", target.get("url"))
+        try:
+            await self.cdp.send("Target.closeTarget",
+                                {"targetId": target["targetId"]})
+        except CDPError:
+            self._logger.debug("stray tab already gone", exc_info=True)
+
+    async def _open_tab(self, url: str, background: bool) -> str:
+        async with self.tab_lock:
+            result = await self.cdp.send("Target.createTarget",
+                                         {"url": url,
+                                          "background": background})
+            target = result["targetId"]
+            self.allowed_targets.add(target)
+        self.tabs[url] = target
+        await self._attach(target)
+        return target
+
+    async def _evict(self):
+        pooled = [url for url, target in self.tabs.items()
+                  if target not in (self.ha_target, self.active_target)]
+        while len(pooled) > self.pool_size:
+            url = pooled.pop(0)
+            target = self.tabs.pop(url)
+            self.sessions.pop(target, None)
+            self.allowed_targets.discard(target)
+            self._logger.info("evicting pooled tab %s", url)
+            try:
+                await self.cdp.send("Target.closeTarget", {"targetId": target})
+            except CDPError:
+                self._logger.debug("pooled tab already gone", exc_info=True)
+
+    async def preload(self, urls: list):
+        for url in urls[:self.pool_size]:
+            if url not in self.tabs:
+                self._logger.info("preloading %s", url)
+                await self._open_tab(url, background=True)
+
+    async def show(self, url: str):
+        target = self.tabs.get(url)
+        if target is None:
+            if self.pool_size:
+                target = await self._open_tab(url, background=False)
+            else:
+                await self.navigate(url)
+                return
+        else:
+            await self.cdp.send("Target.activateTarget", {"targetId": target})
+
+        self.tabs.move_to_end(url)
+        self.active_target = target
+        await self._evict()
+
+    async def add_script(self, source: str):
+        if source in self.scripts:
+            return
+        self.scripts.append(source)
+        for session in self.sessions.values():
+            await self.cdp.send("Page.addScriptToEvaluateOnNewDocument",
+                                {"source": source}, session_id=session)
+            await self.evaluate(source, session_id=session)
+
+    async def enable_performance(self):
+        self.performance = True
+        for session in self.sessions.values():
+            await self.cdp.send("Performance.enable", session_id=session)
+
+    async def performance_metrics(self) -> dict:
+        result = await self.cdp.send("Performance.getMetrics",
+                                     session_id=self.active_session)
+        return {metric["name"]: metric["value"]
+                for metric in result["metrics"]}
+
+    async def set_active(self, active: bool):
+        try:
+            await self.cdp.send("Page.setWebLifecycleState",
+                                {"state": "active" if active else "frozen"},
+                                session_id=self.active_session)
+        except CDPError as e:
+            if active:
+                self._logger.debug("page was not frozen: %s", e)
+            else:
+                self._logger.info("cannot freeze page (%s), throttling", e)
+                await self._throttle(BACKGROUND_CPU_THROTTLE)
+        if active and self.throttled:
+            await self._throttle(1)
+
+    async def _throttle(self, rate: float):
+        await self.cdp.send("Emulation.setCPUThrottlingRate", {"rate": rate},
+                            session_id=self.active_session)
+        self.throttled = rate > 1
+
+    async def capture_screenshot(self, image_format: str, scale: float,
+                                 viewport: tuple,
+                                 quality: int | None = None) -> str:
+        params = {"format": image_format,
+                  "clip": {"x": 0, "y": 0,
+                           "width": viewport[0], "height": viewport[1],
+                           "scale": scale},
+                  "optimizeForSpeed": True}
+        if quality is not None:
+            params["quality"] = quality
+        result = await self.cdp.send("Page.captureScreenshot", params,
+                                     session_id=self.active_session)
+        return result["data"]
+
+    async def reload(self):
+        await self.cdp.send("Page.reload", session_id=self.active_session)
+
+    async def reload_all(self):
+        for session in self.sessions.values():
+            await self.cdp.send("Page.reload", session_id=session)
+
+    async def navigate(self, url: str, target: str | None = None):
+        target = target or self.active_target
+        await self.cdp.send("Page.navigate", {"url": url},
+                            session_id=self.sessions[target])
+        for pooled_url, pooled_target in list(self.tabs.items()):
+            if pooled_target == target:
+                del self.tabs[pooled_url]
+        self.tabs[url] = target
+
+    async def replace_url(self, old_url: str, url: str):
+        target = self.tabs.get(old_url)
+        if target is not None:
+            await self.navigate(url, target)
+
+    async def evaluate(self, expression: str,
+                       timeout: float = COMMAND_TIMEOUT,
+                       session_id: str | None = None):
+        result = await self.cdp.send("Runtime.evaluate",
+                                     {"expression": expression,
+                                      "returnByValue": True,
+                                      "awaitPromise": True},
+                                     session_id=session_id or self.active_session,
+                                     timeout=timeout)
+        if "exceptionDetails" in result:
+            raise CDPError(result["exceptionDetails"].get("text"))
+        return result["result"].get("value")
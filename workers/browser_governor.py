@@ -0,0 +1,123 @@
+import asyncio
+import time
+import logging
+
+import psutil
+
+from workers.cdp import CDPError
+
+CPU_SUSTAIN_SAMPLES = 10
+ACTION_COOLDOWN = 600
+
+INPUT_TRACKER_SCRIPT = """
+(() => {
+    if (window.__kioskIdle) return;
+    let lastInput = Date.now();
+    const touch = () => { lastInput = Date.now(); };
+    for (const type of ["pointerdown", "keydown", "touchstart", "wheel"]) {
+        window.addEventListener(type, touch, {capture: true, passive: true});
+    }
+    window.__kioskIdle = () => (Date.now() - lastInput) / 1000;
+})();
+"""
+
+
+class BrowserGovernor:
+    def __init__(self, push_sensors, pid: int, browser, message_queue,
+                 config):
+        self._logger = logging.getLogger("BrowserGovernor")
+
+        self.push_sensors = push_sensors
+        self.browser = browser
+        self.message_queue = message_queue
+        self.config = config
+
+        self.root = psutil.Process(pid)
+        self.processes = {}
+        self.cpu_over = 0
+        self.reloaded = False
+        self.last_action = 0
+        self.pending = None
+
+    def _sample(self) -> tuple:
+        try:
+            tree = [self.root] + self.root.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return 0, 0
+
+        processes = {}
+        rss = 0
+        cpu = 0
+        for process in tree:
+            process = self.processes.get(process.pid, process)
+            try:
+                with process.oneshot():
+                    rss += process.memory_info().rss
+                    cpu += process.cpu_percent(None)
+            except psutil.NoSuchProcess:
+                continue
+            processes[process.pid] = process
+        self.processes = processes
+
+        return round(rss / 1048576, 1), round(cpu, 1)
+
+    def _decide(self, rss: float, cpu: float):
+        reload_rss = self.config.browser_reload_rss
+        restart_rss = self.config.browser_restart_rss
+        cpu_limit = self.config.browser_cpu_limit
+        if not reload_rss or rss <= reload_rss:
+            self.reloaded = False
+
+        if cpu_limit and cpu > cpu_limit:
+            self.cpu_over += 1
+        else:
+            self.cpu_over = 0
+
+        if time.monotonic() - self.last_action < ACTION_COOLDOWN:
+            return None
+
+        if restart_rss and rss > restart_rss:
+            return "restart", f"rss {rss} MB > {restart_rss} MB"
+        if reload_rss and rss > reload_rss:
+            if self.reloaded:
+                return "restart", f"rss {rss} MB still > {reload_rss} MB after reload"
+            return "reload", f"rss {rss} MB > {reload_rss} MB"
+        if self.cpu_over >= CPU_SUSTAIN_SAMPLES:
+            return "reload", f"cpu {cpu}% > {cpu_limit}% for {self.cpu_over} samples"
+        return None
+
+    async def _is_idle(self) -> bool:
+        try:
+            idle = await self.browser.evaluate(
+                "window.__kioskIdle ? window.__kioskIdle() : null")
+        except (CDPError, asyncio.TimeoutError):
+            self._logger.debug("idle probe failed", exc_info=True)
+            return False
+        return idle is None or idle >= self.config.browser_idle_after
+
+    async def run(self):
+        await self.browser.add_script(INPUT_TRACKER_SCRIPT)
+
+        loop = asyncio.get_running_loop()
+        while True:
+            rss, cpu = await loop.run_in_executor(None, self._sample)
+            self.push_sensors({"browser_rss": rss, "browser_cpu": cpu})
+
+            if self.pending is None:
+                self.pending = self._decide(rss, cpu)
+                if self.pending is not None:
+                    self._logger.warning("browser %s scheduled: %s",
+                                         *self.pending)
+
+            if self.pending is not None and await self._is_idle():
+                action, reason = self.pending
+                self._logger.info("browser %s at idle moment (%s)",
+                                  action, reason)
+                self.pending = None
+                self.last_action = time.monotonic()
+                self.cpu_over = 0
+                self.reloaded = action == "reload"
+                self.message_queue.put_nowait({"command": action,
+                                               "arg": {"reason": reason}})
+
+            await asyncio.sleep(self.config.browser_governor_interval)
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import logging
+import urllib.request
+from collections import defaultdict
+
+from websockets.asyncio.client import connect
+
+COMMAND_TIMEOUT = 10
+
+
+class CDPError(Exception):
+    pass
+
+
+class CDPSession:
+    def __init__(self, debugger_address: str):
+        self._logger = logging.getLogger("CDPSession")
+
+        self.debugger_address = debugger_address
+        self.websocket = None
+        self.reader_task = None
+        self.last_id = 0
+        self.pending = {}
+        self.handlers = defaultdict(list)
+        self._handler_tasks = set()
+
+    def _get_browser_url(self) -> str:
+        with urllib.request.urlopen(
+                f"http://{self.debugger_address}/json/version") as response:
+            return json.load(response)["webSocketDebuggerUrl"]
+
+    async def connect(self):
+        url = await asyncio.get_running_loop().run_in_executor(
+            None, self._get_browser_url)
+        self.websocket = await connect(url, max_size=None)
+        self.reader_task = asyncio.create_task(self._reader(),
+                                               name="cdp_reader")
+
+    async def close(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+        if self.reader_task is not None:
+            await asyncio.gather(self.reader_task, return_exceptions=True)
+        for task in self._handler_tasks:
+            task.cancel()
+        await asyncio.gather(*self._handler_tasks, return_exceptions=True)
+        self.websocket = None
+        self.reader_task = None
+
+    def is_connected(self) -> bool:
+        return self.reader_task is not None and not self.reader_task.done()
+
+    def on(self, event: str, handler):
+        self.handlers[event].append(handler)
+
+    async def send(self, method: str, params: dict | None = None,
+                   session_id: str | None = None,
+                   timeout: float = COMMAND_TIMEOUT) -> dict:
+        if not self.is_connected():
+            raise CDPError("session is closed")
+
+        self.last_id += 1
+        message = {"id": self.last_id, "method": method,
+                   "params": params or {}}
+        if session_id is not None:
+            message["sessionId"] = session_id
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[self.last_id] = future
+        try:
+            await self.websocket.send(json.dumps(message))
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(message["id"], None)
+
+    def _handler_done(self, task: asyncio.Task):
+        self._handler_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self._logger.error("handler task %s failed", task.get_name(),
+                               exc_info=task.exception())
+
+    async def _reader(self):
+        try:
+            async for raw in self.websocket:
+                message = json.loads(raw)
+                if "id" in message:
+                    future = self.pending.get(message["id"])
+                    if future is None or future.done():
+                        continue
+                    if "error" in message:
+                        future.set_exception(
+                            CDPError(message["error"].get("message")))
+                    else:
+                        future.set_result(message.get("result", {}))
+                    continue
+
+                for handler in self.handlers.get(message.get("method"), []):
+                    try:
+                        result = handler(message.get("params", {}),
+                                         message.get("sessionId"))
+                        if asyncio.iscoroutine(result):
+                            task = asyncio.create_task(
+                                result, name=f"cdp_{message["method"]}")
+                            self._handler_tasks.add(task)
+                            task.add_done_callback(self._handler_done)
+                    except Exception:
+                        self._logger.exception("handler for %s failed",
+                                               message["method"],
+                                               exc_info=True)
+        except Exception:
+            self._logger.warning("devtools connection lost", exc_info=True)
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(CDPError("session is closed"))
@@ -0,0 +1,38 @@
+import json
+import os
+import logging
+
+from const.chrome_profiles import CHROME_PROFILES
+
+DEFAULT_PROFILE = "default"
+PROFILE_FILE = "chrome_profile.json"
+
+
+def profile_path(working_directory: str, path: str | None = None) -> str:
+    return path or os.path.join(working_directory, PROFILE_FILE)
+
+
+def load_chrome_profile(working_directory: str, name: str | None = None,
+                        path: str | None = None) -> tuple:
+    if name is not None:
+        return name, CHROME_PROFILES[name]
+
+    path = profile_path(working_directory, path)
+    try:
+        with open(path) as file:
+            saved = json.load(file)
+        return saved["profile"], list(saved["flags"])
+    except FileNotFoundError:
+        return DEFAULT_PROFILE, CHROME_PROFILES[DEFAULT_PROFILE]
+    except (OSError, ValueError, KeyError, TypeError):
+        logging.getLogger("ChromeProfile").warning(
+            "ignoring unreadable chrome profile %s", path, exc_info=True)
+        return DEFAULT_PROFILE, CHROME_PROFILES[DEFAULT_PROFILE]
+
+
+def save_chrome_profile(path: str, name: str, results: dict):
+    temporary = path + ".tmp"
+    with open(temporary, "w") as file:
+        json.dump({"profile": name, "flags": CHROME_PROFILES[name],
+                   "results": results}, file, indent=2)
+    os.replace(temporary, path)
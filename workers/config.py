@@ -0,0 +1,326 @@
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+from dataclasses import dataclass, field, fields
+from urllib.parse import urlsplit
+
+from dotenv import dotenv_values
+
+from const.chrome_profiles import CHROME_PROFILES
+from workers.displays import parse_displays, parse_dashboards
+from workers.log_pipeline import LOGS
+from workers.screen_power import parse_schedule
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+RELOAD_DELAY = 0.5
+RESTART_FIELDS = ["displays", "window_size", "keep_browser", "tab_pool",
+                  "chrome_profile", "chrome_profile_file", "log_file",
+                  "log_max_bytes", "log_backup_count", "log_ring_size"]
+LOG_LEVELS = logging.getLevelNamesMapping()
+
+
+def _flag(value: str | None) -> bool:
+    return (value or "false").lower() in ("1", "true", "yes")
+
+
+def _log_level(value: str | None) -> int:
+    return LOG_LEVELS.get((value or "").strip().upper(), logging.WARNING)
+
+
+@dataclass(frozen=True)
+class Config:
+    ifname: str
+    ha_url: str
+    display_urls: dict
+    ha_access_token: str | None = field(repr=False)
+    ha_refresh_token: str | None = field(repr=False)
+    ha_login: str | None
+    ha_password: str | None = field(repr=False)
+    mqtt_host: str
+    mqtt_port: int
+    mqtt_username: str | None
+    mqtt_password: str | None = field(repr=False)
+    backlight_device: str | None
+    log_level: int
+    displays: str | None
+    window_size: tuple
+    keep_browser: bool
+    tab_pool: int
+    chrome_profile: str | None
+    chrome_profile_file: str | None
+    dashboards: dict
+    mqtt_state_coalesce: float
+    mqtt_state_heartbeat: float
+    mqtt_reconnect_min: float
+    mqtt_reconnect_max: float
+    mqtt_discovery_jitter: float
+    browser_resume_reload_after: float
+    browser_governor_interval: float
+    browser_reload_rss: float
+    browser_restart_rss: float
+    browser_cpu_limit: float
+    browser_idle_after: float
+    screen_idle_timeout: float
+    screen_off_schedule: tuple | None
+    page_telemetry_interval: float
+    screenshot_interval: float
+    screenshot_width: int
+    screenshot_quality: int
+    screenshot_cpu_budget: float
+    metrics_interval: float
+    supervisor_interval: float
+    supervisor_hang_timeout: float
+    supervisor_max_restarts: int
+    renderer_check_interval: float
+    renderer_deadline: float
+    log_file: str
+    log_max_bytes: int
+    log_backup_count: int
+    log_ring_size: int
+
+    @classmethod
+    def from_env(cls) -> "Config":
+        def require(name: str) -> str:
+            value = os.getenv(name)
+            if not value:
+                raise ValueError(f"{name} is not set")
+            return value
+
+        def number(name: str, default: str, kind=float,
+                   positive: bool = False):
+            value = os.getenv(name) or default
+            try:
+                parsed = kind(value)
+            except ValueError:
+                raise ValueError(f"{name} must be a number, "
+                                 f"got {value!r}") from None
+            if parsed < 0 or (positive and parsed == 0):
+                raise ValueError(f"{name} must be "
+                                 f"{"positive" if positive else "at least 0"}"
+                                 f", got {parsed}")
+            return parsed
+
+        mqtt_port = number("MQTT_PORT", "1883", int)
+        if not 0 < mqtt_port < 65536:
+            raise ValueError(f"MQTT_PORT {mqtt_port} is out of range")
+        try:
+            window_size = tuple(
+                map(int, os.getenv("WINDOW_SIZE", "1280,720").split(",")))
+        except ValueError as e:
+            raise ValueError(f"invalid number in WINDOW_SIZE: {e}") from e
+        if len(window_size) != 2:
+            raise ValueError("WINDOW_SIZE must be WIDTH,HEIGHT")
+
+        reconnect_min = number("MQTT_RECONNECT_MIN", "1", positive=True)
+        reconnect_max = number("MQTT_RECONNECT_MAX", "60", positive=True)
+        if reconnect_max < reconnect_min:
+            raise ValueError("MQTT_RECONNECT_MAX is below MQTT_RECONNECT_MIN")
+
+        screenshot_quality = number("SCREENSHOT_QUALITY", "60", int,
+                                    positive=True)
+        if screenshot_quality > 100:
+            raise ValueError(f"SCREENSHOT_QUALITY {screenshot_quality} "
+                             f"is over 100")
+
+        try:
+            screen_off_schedule = parse_schedule(
+                os.getenv("SCREEN_OFF_SCHEDULE", ""))
+        except ValueError as e:
+            raise ValueError(f"invalid SCREEN_OFF_SCHEDULE, expected "
+                             f"HH:MM-HH:MM: {e}") from e
+
+        chrome_profile = os.getenv("CHROME_PROFILE") or None
+        if chrome_profile is not None and chrome_profile not in CHROME_PROFILES:
+            raise ValueError(f"unknown CHROME_PROFILE {chrome_profile!r}")
+
+        ha_url = require("HA_URL")
+        displays = os.getenv("DISPLAYS") or None
+        backlight_device = os.getenv("BACKLIGHT_DEVICE") or None
+        display_urls = {
+            display.name: os.getenv(f"HA_URL_{display.name.upper()}", ha_url)
+            if displays else ha_url
+            for display in parse_displays(displays, window_size,
+                                          backlight_device)}
+        for name, url in display_urls.items():
+            if urlsplit(url or "").scheme not in ("http", "https"):
+                raise ValueError(f"dashboard url {url!r} of {name} "
+                                 f"is not an http(s) url")
+
+        return cls(
+            ifname=require("IFNAME"),
+            ha_url=ha_url,
+            display_urls=display_urls,
+            ha_access_token=os.getenv("HA_ACCESS_TOKEN"),
+            ha_refresh_token=os.getenv("HA_REFRESH_TOKEN"),
+            ha_login=os.getenv("HA_LOGIN"),
+            ha_password=os.getenv("HA_PASSWORD"),
+            mqtt_host=require("MQTT_HOST"),
+            mqtt_port=mqtt_port,
+            mqtt_username=os.getenv("MQTT_USERNAME"),
+            mqtt_password=os.getenv("MQTT_PASSWORD"),
+            backlight_device=backlight_device,
+            log_level=_log_level(os.getenv("LOG_LEVEL")),
+            displays=displays,
+            window_size=window_size,
+            keep_browser=_flag(os.getenv("BROWSER_KEEP_ALIVE")),
+            tab_pool=number("BROWSER_TAB_POOL", "0", int),
+            chrome_profile=chrome_profile,
+            chrome_profile_file=os.getenv("CHROME_PROFILE_FILE") or None,
+            dashboards=parse_dashboards(os.getenv("DASHBOARDS", "")),
+            mqtt_state_coalesce=number("MQTT_STATE_COALESCE", "0.25"),
+            mqtt_state_heartbeat=number("MQTT_STATE_HEARTBEAT", "0"),
+            mqtt_reconnect_min=reconnect_min,
+            mqtt_reconnect_max=reconnect_max,
+            mqtt_discovery_jitter=number("MQTT_DISCOVERY_JITTER", "5"),
+            browser_resume_reload_after=number("BROWSER_RESUME_RELOAD_AFTER",
+                                               "60"),
+            browser_governor_interval=number("BROWSER_GOVERNOR_INTERVAL",
+                                             "30", positive=True),
+            browser_reload_rss=number("BROWSER_RELOAD_RSS", "0"),
+            browser_restart_rss=number("BROWSER_RESTART_RSS", "0"),
+            browser_cpu_limit=number("BROWSER_CPU_LIMIT", "0"),
+            browser_idle_after=number("BROWSER_IDLE_AFTER", "60"),
+            screen_idle_timeout=number("SCREEN_IDLE_TIMEOUT", "0"),
+            screen_off_schedule=screen_off_schedule,
+            page_telemetry_interval=number("PAGE_TELEMETRY_INTERVAL", "60"),
+            screenshot_interval=number("SCREENSHOT_INTERVAL", "0"),
+            screenshot_width=number("SCREENSHOT_WIDTH", "640", int,
+                                    positive=True),
+            screenshot_quality=screenshot_quality,
+            screenshot_cpu_budget=number("SCREENSHOT_CPU_BUDGET", "2"),
+            metrics_interval=number("METRICS_INTERVAL", "60", positive=True),
+            supervisor_interval=number("SUPERVISOR_INTERVAL", "5",
+                                       positive=True),
+            supervisor_hang_timeout=number("SUPERVISOR_HANG_TIMEOUT", "180",
+                                           positive=True),
+            supervisor_max_restarts=number("SUPERVISOR_MAX_RESTARTS", "3",
+                                           int),
+            renderer_check_interval=number("RENDERER_CHECK_INTERVAL", "10"),
+            renderer_deadline=number("RENDERER_DEADLINE", "5", positive=True),
+            log_file=os.getenv("LOG_FILE") or "kiosk.log",
+            log_max_bytes=number("LOG_MAX_BYTES", "1048576", int),
+            log_backup_count=number("LOG_BACKUP_COUNT", "3", int),
+            log_ring_size=number("LOG_RING_SIZE", "2000", int))
+
+    def changed(self, other: "Config") -> list:
+        return [entry.name for entry in fields(self)
+                if getattr(self, entry.name) != getattr(other, entry.name)]
+
+
+class ConfigWatcher:
+    def __init__(self, path: str, message_bus, config: Config):
+        self._logger = logging.getLogger("ConfigWatcher")
+
+        self.path = os.path.abspath(path)
+        self.message_bus = message_bus
+        self.config = config
+
+        self.file_values = self._read()
+        self.process_environ = {
+            name: value for name, value in os.environ.items()
+            if self.file_values.get(name) != value}
+
+        self.loop = None
+        self.fd = None
+        self.reload_handle = None
+
+    def _read(self) -> dict:
+        return {name: value for name, value in dotenv_values(self.path).items()
+                if value is not None}
+
+    def start(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0 or libc.inotify_add_watch(
+                fd, os.path.dirname(self.path).encode(),
+                IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) < 0:
+            error = ctypes.get_errno()
+            if fd >= 0:
+                os.close(fd)
+            self._logger.warning("cannot watch %s: %s, hot reload disabled",
+                                 self.path, os.strerror(error))
+            return
+
+        self.fd = fd
+        self.loop = asyncio.get_running_loop()
+        self.loop.add_reader(self.fd, self._on_events)
+        self._logger.info("watching %s", self.path)
+
+    async def stop(self):
+        if self.reload_handle is not None:
+            self.reload_handle.cancel()
+            self.reload_handle = None
+        if self.fd is not None:
+            self.loop.remove_reader(self.fd)
+            os.close(self.fd)
+            self.fd = None
+
+    def _on_events(self):
+        try:
+            data = os.read(self.fd, 4096)
+        except BlockingIOError:
+            return
+
+        name = os.path.basename(self.path).encode()
+        offset = 0
+        touched = False
+        while offset < len(data):
+            _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            touched |= data[offset:offset + length].rstrip(b"\0") == name
+            offset += length
+
+        if touched and self.reload_handle is None:
+            self.reload_handle = self.loop.call_later(RELOAD_DELAY,
+                                                      self._reload)
+
+    def _apply_environ(self, values: dict):
+        for name in self.file_values.keys() - values.keys():
+            if name not in self.process_environ:
+                os.environ.pop(name, None)
+        for name, value in values.items():
+            if name not in self.process_environ:
+                os.environ[name] = value
+        self.file_values = values
+
+    def _reload(self):
+        self.reload_handle = None
+        try:
+            values = self._read()
+        except OSError as e:
+            self._logger.warning("cannot read %s: %s", self.path, e)
+            return
+        if values == self.file_values:
+            return
+
+        previous_values = self.file_values
+        self._apply_environ(values)
+        try:
+            config = Config.from_env()
+        except ValueError as e:
+            self._logger.error("ignoring invalid configuration: %s", e)
+            self._apply_environ(previous_values)
+            return
+
+        changed = self.config.changed(config)
+        self.config = config
+        if not changed:
+            return
+
+        self._logger.info("configuration changed: %s", changed)
+        if "log_level" in changed:
+            LOGS.set_level(config.log_level)
+        restart = [name for name in changed if name in RESTART_FIELDS]
+        if restart:
+            self._logger.warning("%s only take effect after a restart",
+                                 restart)
+        self.message_bus.put({"command": "config_changed",
+                              "arg": {"config": config, "changed": changed}})
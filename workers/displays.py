@@ -0,0 +1,91 @@
+import re
+from urllib.parse import urljoin
+
+GEOMETRY = re.compile(r"(\d+)x(\d+)(?:\+(\d+)\+(\d+))?")
+KEY_SEPARATOR = "__"
+HOME_DASHBOARD = "Home"
+
+
+class Display:
+    def __init__(self, name: str, size: tuple, position: tuple = (0, 0),
+                 backlight: str | None = None, url: str | None = None,
+                 primary: bool = False):
+        self.name = name
+        self.size = size
+        self.position = position
+        self.backlight = backlight or None
+        self.url = url
+        self.primary = primary
+
+    def key(self, key: str) -> str:
+        if self.primary:
+            return key
+        return f"{self.name}{KEY_SEPARATOR}{key}"
+
+    def owns(self, message: dict) -> bool:
+        display = message.get("display")
+        if display is None:
+            return self.primary
+        return display == self.name
+
+    def suffix(self, value: str) -> str:
+        if self.primary:
+            return value
+        return f"{value}_{self.name}"
+
+    def dashboard_url(self, dashboard: str, dashboards: dict) -> str:
+        if dashboard == HOME_DASHBOARD:
+            return self.url
+        path = dashboards.get(dashboard, dashboard)
+        if "://" in path:
+            return path
+        return urljoin(self.url, "/" + path.lstrip("/"))
+
+
+def base_key(sensor: str) -> str:
+    return sensor.rpartition(KEY_SEPARATOR)[2]
+
+
+def parse_displays(spec: str | None, window_size: tuple,
+                   backlight_device: str | None) -> list:
+    if not spec:
+        return [Display("main", window_size, (0, 0), backlight_device,
+                        primary=True)]
+
+    displays = []
+    for index, entry in enumerate(spec.split(";")):
+        name, geometry, *backlight = entry.strip().split(":")
+        match = GEOMETRY.fullmatch(geometry)
+        if match is None:
+            raise ValueError(f"invalid geometry {geometry!r} for {name}")
+        if any(display.name == name for display in displays):
+            raise ValueError(f"display {name!r} is listed twice")
+        width, height, x, y = match.groups()
+        displays.append(Display(
+            name,
+            (int(width), int(height)),
+            (int(x or 0), int(y or 0)),
+            backlight[0] if backlight else None,
+            primary=index == 0))
+    return displays
+
+
+def load_displays(config) -> list:
+    displays = parse_displays(config.displays, config.window_size,
+                              config.backlight_device)
+    for display in displays:
+        display.url = config.display_urls[display.name]
+    return displays
+
+
+def parse_dashboards(spec: str) -> dict:
+    dashboards = {HOME_DASHBOARD: ""}
+    for entry in spec.split(";"):
+        if not entry.strip():
+            continue
+        name, separator, path = entry.partition("=")
+        if not separator or not name.strip() or not path.strip():
+            raise ValueError(f"invalid dashboard {entry.strip()!r}, "
+                             f"expected NAME=PATH")
+        dashboards[name.strip()] = path.strip()
+    return dashboards
@@ -0,0 +1,69 @@
+import json
+from urllib.parse import urlsplit
+
+LONG_LIVED_TOKEN_EXPIRES = 4102444800000
+
+TOKEN_SCRIPT = """
+(() => {
+    if (location.origin !== %(origin)s) return;
+    try {
+        const stored = JSON.parse(localStorage.getItem("hassTokens") || "null");
+        if (stored && (stored.refresh_token || stored.expires > Date.now())) {
+            window.__kioskAuth = "stored";
+            return;
+        }
+    } catch (e) {}
+    const tokens = %(tokens)s;
+    if (tokens === null) {
+        window.__kioskAuth = "none";
+        return;
+    }
+    localStorage.setItem("hassTokens", JSON.stringify(tokens));
+    window.__kioskAuth = "injected";
+})();
+"""
+
+AUTH_STATE_SCRIPT = """
+if (location.pathname.startsWith("/auth/authorize")) return "login";
+const ha = document.querySelector("home-assistant");
+return ha && ha.hass ? "authenticated" : null;
+"""
+
+FIRST_PAINT_SCRIPT = """
+const paint = performance.getEntriesByName("first-contentful-paint")[0];
+return paint ? performance.timeOrigin + paint.startTime : null;
+"""
+
+
+def get_origin(ha_url: str) -> str:
+    url = urlsplit(ha_url)
+    return f"{url.scheme}://{url.netloc}"
+
+
+def build_tokens(ha_url: str, access_token: str | None,
+                 refresh_token: str | None) -> dict | None:
+    origin = get_origin(ha_url)
+    tokens = {
+        "token_type": "Bearer",
+        "hassUrl": origin,
+        "clientId": origin + "/",
+    }
+
+    if refresh_token:
+        tokens.update({"access_token": "", "refresh_token": refresh_token,
+                       "expires_in": 0, "expires": 0})
+    elif access_token:
+        tokens.update({"access_token": access_token, "refresh_token": "",
+                       "expires_in": 1800,
+                       "expires": LONG_LIVED_TOKEN_EXPIRES})
+    else:
+        return None
+    return tokens
+
+
+def token_script(ha_url: str, access_token: str | None,
+                 refresh_token: str | None) -> str:
+    return TOKEN_SCRIPT % {
+        "origin": json.dumps(get_origin(ha_url)),
+        "tokens": json.dumps(build_tokens(ha_url, access_token, refresh_token))
+    }
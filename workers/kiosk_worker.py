@@ -1,31 +1,64 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.by import By
-import queue
+import asyncio
 import os
+import queue
 import time
 import logging
-from threading import Thread
-from tkinter import font
-import ttkbootstrap as ttk
-from sdbus_block.networkmanager import DeviceState
+import psutil
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from workers.ha_auth import (
+    token_script,
+    get_origin,
+    AUTH_STATE_SCRIPT,
+    FIRST_PAINT_SCRIPT
+)
+from workers.browser_controller import BrowserController
+from workers.browser_governor import BrowserGovernor
+from workers.page_telemetry import PageTelemetry
+from workers.renderer_watchdog import RendererWatchdog, kill_browser
+from workers.chrome_profile import load_chrome_profile
+from workers.screenshot import ScreenshotPublisher
+from workers.displays import load_displays, HOME_DASHBOARD
+from workers.startup_timeline import TIMELINE
+from workers.metrics import METRICS
+from workers.config import Config
+
+QUEUE_SIZE = 64
+HA_RETRY_MIN = 5
+HA_RETRY_MAX = 60
 
 
 class UICompositor:
-    def __init__(self, working_directory: str, uid: str):
-        self.ui_worker = UIWorker()
-        self.chrome_worker = ChromeWorker(working_directory, uid)
+    HANDLED_COMMANDS = ["if_state", "reload", "navigate", "dashboard_ready",
+                        "page_visibility", "config_changed", "exit"]
+
+    def __init__(self, working_directory: str, uid: str, message_bus,
+                 display=None, config=None):
+        self.message_bus = message_bus
+        self.config = config or Config.from_env()
+        self.display = display or load_displays(self.config)[0]
+        self.keep_browser = self.config.keep_browser
+        self.ui_worker = UIWorker(self.display, topmost=self.keep_browser)
+        self.chrome_worker = ChromeWorker(working_directory, uid, message_bus,
+                                          self.display, self.config)
         self.ifstate = None
         self.current_worker = None
+        self.disconnected_at = None
 
-    def push_command(self, command):
+    def start(self):
+        self.current_worker = self.ui_worker
+        self.ui_worker.start()
+
+    async def push_command(self, command):
         if command["command"] == "exit":
             self.chrome_worker.stop()
-            self.ui_worker.stop()
+            self.ui_worker.quit()
+            await self.chrome_worker.wait_stopped()
+            await self.ui_worker.wait_stopped()
         elif command["command"] == "if_state":
+            from sdbus_async.networkmanager import DeviceState
+
             dev_state = DeviceState(command["arg"]["state"])
 
             label_text = ""
@@ -54,55 +87,116 @@ class UICompositor:
                     "arg": progress_visibility})
 
             new_state = dev_state is DeviceState.ACTIVATED
+            if new_state:
+                TIMELINE.mark("network_activated")
 
             if self.ifstate != new_state:
                 self.ifstate = new_state
-                if self.current_worker == self.chrome_worker:
-                    self.current_worker.stop()
-
-                if new_state:
-                    self.current_worker = self.chrome_worker
+                if self.keep_browser:
+                    self._switch_keep_browser(new_state)
                 else:
-                    self.current_worker = self.ui_worker
-
-                self.current_worker.start()
+                    self._switch(new_state)
+
+            self.message_bus.complete(command)
+        elif command["command"] == "config_changed":
+            if self.chrome_worker.is_running():
+                self.chrome_worker.push_command(command)
+            else:
+                self.chrome_worker.apply_config(command["arg"]["config"])
+        elif not self.display.owns(command):
+            return
+        elif command["command"] == "page_visibility":
+            self.chrome_worker.page_active = command["arg"]
+            if self.chrome_worker.is_running():
+                self.chrome_worker.push_command(command)
+        elif command["command"] == "dashboard_ready":
+            if self.keep_browser and self.ifstate:
+                self.ui_worker.stop()
         elif self.current_worker is not None:
             self.current_worker.push_command(command)
 
+    def _switch(self, new_state: bool):
+        if self.current_worker == self.chrome_worker:
+            self.current_worker.stop()
+
+        if new_state:
+            self.current_worker = self.chrome_worker
+        else:
+            self.current_worker = self.ui_worker
+
+        self.current_worker.start()
+
+    def _switch_keep_browser(self, new_state: bool):
+        if not new_state:
+            self.disconnected_at = time.monotonic()
+            self.current_worker = self.ui_worker
+            self.ui_worker.start()
+            return
+
+        if self.chrome_worker.is_running():
+            self.chrome_worker.push_command({
+                "command": "resume",
+                "arg": {"disconnected_at": self.disconnected_at}
+            })
+        else:
+            self.chrome_worker.start()
+        self.current_worker = self.chrome_worker
+
 
 class UIWorker:
-    def __init__(self):
-        self.terminate = None
-        self.spawn_window = False
-        self.worker_thread = None
+    def __init__(self, display, topmost: bool = False):
+        self.display = display
+        self.topmost = topmost
+        self.visible = False
+        self.running = False
+        self.worker_future = None
         self.worker_queue = queue.Queue()
-        pass
+        self.wakeup_r, self.wakeup_w = os.pipe()
+        os.set_blocking(self.wakeup_r, False)
+        self.executor = ThreadPoolExecutor(max_workers=1,
+                                           thread_name_prefix="UI_thread")
 
     def start(self):
-        if self.terminate == False:
-            return
-        self.terminate = False
-        self.spawn_window = True
-        self.worker_thread = Thread(target=self._thread,
-                                    name="UI_thread")
-        self.worker_thread.start()
+        if self.worker_future is None:
+            self.worker_future = asyncio.get_running_loop().run_in_executor(
+                self.executor, self._thread)
+        if not self.visible:
+            self.visible = True
+            self.push_command({"command": "ui_show"})
 
     def stop(self):
-        if self.terminate:
+        if not self.visible:
             return
-        self.terminate = True
+        self.visible = False
+        self.push_command({"command": "ui_hide"})
+
+    def quit(self):
+        self.visible = False
+        self.push_command({"command": "ui_quit"})
+
+    async def wait_stopped(self):
+        if self.worker_future is not None:
+            await asyncio.gather(self.worker_future, return_exceptions=True)
 
     def push_command(self, command):
         self.worker_queue.put(command)
+        os.write(self.wakeup_w, b"\0")
 
     def _init_window(self):
-        window_size = list(map(int, os.getenv("WINDOW_SIZE").split(",")))
+        from tkinter import font
+        import ttkbootstrap as ttk
+
+        window_size = self.display.size
+        self.window_width = window_size[0]
 
         self.window = ttk.Window(themename="darkly",
-                                 position=(0, 0),
+                                 position=self.display.position,
                                  size=(window_size),
                                  resizable=(False, False),
                                  overrideredirect=True)
+        self.window.withdraw()
+        if self.topmost:
+            self.window.attributes("-topmost", True)
 
         fontObj = font.Font(size=24, weight="bold")
 
@@ -119,128 +213,506 @@ class UIWorker:
                                                   orient="horizontal",
                                                   bootstyle="dark")
         self.status_progress_bar.place_forget()
-        self.status_progress_bar.start()
+        self.progress_visible = False
 
-    def _thread(self):
-        self._init_window()
-        while not self.terminate:
-            time.sleep(0.1)
-            if not self.worker_queue.empty():
-                message = self.worker_queue.get()
-                if message["command"] == "ui_update_status_text":
+    def _set_progress(self, visible: bool):
+        if visible == self.progress_visible:
+            return
+        self.progress_visible = visible
+        if visible:
+            self.status_progress_bar.place(rely=0.8, relx=0.5,
+                                           width=self.window_width // 3,
+                                           anchor="center")
+            self.status_progress_bar.start()
+        else:
+            self.status_progress_bar.stop()
+            self.status_progress_bar.place_forget()
+
+    def _on_wakeup(self, fd, mask):
+        try:
+            while os.read(fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+        while True:
+            try:
+                message = self.worker_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            match message["command"]:
+                case "ui_update_status_text":
                     self.status_label["text"] = message["arg"]
-                elif message["command"] == "ui_progress_bar_visibility":
-                    if message["arg"]:
-                        self.status_progress_bar.place(rely=0.8, relx=0.5,
-                                                       width=self.window.winfo_width() // 3,
-                                                       anchor="center")
-                    else:
-                        self.status_progress_bar.place_forget()
+                case "ui_progress_bar_visibility":
+                    self._set_progress(message["arg"])
+                case "ui_show":
+                    self.window.deiconify()
+                    self.window.after_idle(TIMELINE.mark,
+                                           self.display.key("ui_first_frame"))
+                case "ui_hide":
+                    self.window.withdraw()
+                case "ui_quit":
+                    self.running = False
+                    self.window.quit()
 
-            self.window.update_idletasks()
-            self.window.update()
-        self.window.quit()
+    def _thread(self):
+        import tkinter
+
+        self._init_window()
+        self.running = True
+        self.window.tk.createfilehandler(self.wakeup_r, tkinter.READABLE,
+                                         self._on_wakeup)
+        self._on_wakeup(self.wakeup_r, tkinter.READABLE)
+        if self.running:
+            self.window.mainloop()
+        self.window.tk.deletefilehandler(self.wakeup_r)
+        self.window.destroy()
+
+
+def build_chrome_options(display, user_data_dir: str, flags: list):
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+
+    chrome_options.add_experimental_option(
+        "excludeSwitches", ["enable-automation"])
+    chrome_options.add_experimental_option("useAutomationExtension", False)
+    chrome_options.add_argument(
+        f'--window-position={display.position[0]},{display.position[1]}')
+    chrome_options.add_argument(
+        f'--window-size={display.size[0]},{display.size[1]}')
+    chrome_options.add_argument('--disable-infobars')
+    chrome_options.add_argument('--disable-extensions')
+    chrome_options.add_argument("--kiosk")
+    chrome_options.add_argument("--allow-profiles-outside-user-dir")
+    chrome_options.add_argument(f"--user-data-dir={user_data_dir}")
+    chrome_options.add_argument("--profile-directory=kiosk_profile")
+    for flag in flags:
+        chrome_options.add_argument(flag)
+
+    return chrome_options
 
 
 class ChromeWorker:
-    def __init__(self, WORKING_DIRECTORY: str, UNIQUE_ID: str):
-        self._logger = logging.getLogger("ChromeWorker")
+    def __init__(self, WORKING_DIRECTORY: str, UNIQUE_ID: str, message_bus,
+                 display, config: Config):
+        self._logger = logging.getLogger(display.suffix("ChromeWorker"))
 
+        self.message_bus = message_bus
+        self.display = display
+        self.config = config
         self.working_directory = WORKING_DIRECTORY
         self.unique_id = UNIQUE_ID
-        self.message_queue = queue.Queue()
-
-        chrome_options = Options()
-
-        chrome_options.add_experimental_option(
-            "excludeSwitches", ["enable-automation"])
-        chrome_options.add_experimental_option("useAutomationExtension", False)
-        chrome_options.add_argument('--window-position=0,0')
-        chrome_options.add_argument(
-            f'--window-size={os.getenv("WINDOW_SIZE", "1280,720")}')
-        chrome_options.add_argument('--disable-infobars')
-        chrome_options.add_argument('--disable-extensions')
-        chrome_options.add_argument("--kiosk")
-        chrome_options.add_argument("--allow-profiles-outside-user-dir")
-        chrome_options.add_argument(
-            f"--user-data-dir={os.path.join(self.working_directory,
-                                            "driver_data")}")
-        chrome_options.add_argument("--profile-directory=kiosk_profile")
-
-        self.chrome_options = chrome_options
-        self.terminate = False
-
-        self.worker_thread = None
 
-    def start(self):
-        self.terminate = False
-        self.worker_thread = Thread(
-            target=self._thread, name="chrome_thread")
+        self.chrome_options = None
+        self.tab_pool = config.tab_pool
+        self.watchdog = RendererWatchdog(display.suffix("dashboard"),
+                                         self.beat, config)
+        self.heartbeat = time.monotonic()
+        self.dashboard = HOME_DASHBOARD
+
+        self.driver = None
+        self.browser = None
+        self.first_paint_reported = False
+        self.restarts = 0
+        self.page_active = True
+        self.stop_event = None
+        self.message_queue = None
+        self.worker_task = None
+        self.executor = ThreadPoolExecutor(max_workers=1,
+                                           thread_name_prefix="chrome_thread")
 
-        self.worker_thread.start()
+    def start(self):
+        self.beat()
+        self.stop_event = asyncio.Event()
+        self.message_queue = METRICS.queue(self.display.suffix("chrome"),
+                                           QUEUE_SIZE)
+        self.worker_task = asyncio.create_task(
+            self._run(self.worker_task, self.stop_event, self.message_queue),
+            name="chrome_task")
 
         self._logger.info("started")
 
     def stop(self):
-        if self.terminate:
+        if self.stop_event is None or self.stop_event.is_set():
             return
-        self.terminate = True
+        self.stop_event.set()
+        self.message_queue.put_nowait(None)
 
         self._logger.info("stop requested")
 
+    async def wait_stopped(self):
+        if self.worker_task is not None:
+            await asyncio.gather(self.worker_task, return_exceptions=True)
+
+    def is_running(self) -> bool:
+        return self.stop_event is not None and not self.stop_event.is_set()
+
+    def beat(self):
+        self.heartbeat = time.monotonic()
+
+    def is_alive(self) -> bool:
+        if not self.is_running():
+            return True
+        if self.worker_task.done():
+            return False
+        return not self.watchdog.enabled() or \
+            time.monotonic() - self.heartbeat < \
+            self.config.supervisor_hang_timeout
+
+    async def restart(self):
+        if self.driver is not None:
+            killed = await asyncio.get_running_loop().run_in_executor(
+                None, kill_browser, self.driver.service.process.pid)
+            self._logger.info("killed %d browser processes", killed)
+        self.stop()
+        self.start()
+
     def push_command(self, message):
-        self.message_queue.put(message)
+        self.message_queue.put_nowait(message)
+
+    def _build_options(self):
+        profile, flags = load_chrome_profile(self.working_directory,
+                                             self.config.chrome_profile,
+                                             self.config.chrome_profile_file)
+        self._logger.info("using chrome profile %s %s", profile, flags)
+        return build_chrome_options(
+            self.display,
+            os.path.join(self.working_directory,
+                         self.display.suffix("driver_data")),
+            flags)
+
+    async def _call(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, func, *args)
+
+    async def _until_reachable(self, stop_event: asyncio.Event, func) -> bool:
+        from selenium.common.exceptions import (
+            TimeoutException,
+            WebDriverException
+        )
+
+        delay = HA_RETRY_MIN
+        while True:
+            try:
+                await self._call(func)
+                return True
+            except TimeoutException:
+                self._logger.warning("home assistant did not respond, "
+                                     "retrying in %.0f s", delay)
+            except WebDriverException as e:
+                if "net::ERR_" not in str(e):
+                    raise
+                self._logger.warning("home assistant is not reachable (%s), "
+                                     "retrying in %.0f s",
+                                     str(e).strip(), delay)
+            self.beat()
+            try:
+                await asyncio.wait_for(stop_event.wait(), delay)
+                return False
+            except TimeoutError:
+                pass
+            delay = min(delay * 2, HA_RETRY_MAX)
+
+    def _start_browser(self):
+        from selenium import webdriver
+
+        if self.chrome_options is None:
+            self.chrome_options = self._build_options()
+
+        self.driver = webdriver.Chrome(options=self.chrome_options)
+        TIMELINE.mark(self.display.key("browser_started"))
+
+        self.driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
+            "source": token_script(self.display.url,
+                                   self.config.ha_access_token,
+                                   self.config.ha_refresh_token)
+        })
+        self.ha_tab = self.driver.current_window_handle
+
+    def _open_dashboard(self):
+        from selenium import webdriver
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.common.keys import Keys
+        from selenium.webdriver.common.by import By
+
+        wait = WebDriverWait(self.driver, 20)
+        self.driver.get(self.display.url)
+
+        auth_state = wait.until(
+            lambda driver: driver.execute_script(AUTH_STATE_SCRIPT))
+
+        if auth_state == "login":
+            self._logger.info("no usable stored token, logging in with form")
+            wait.until(EC.presence_of_element_located((By.NAME, "username")))
+            login_input = self.driver.find_element(By.NAME, "username")
+            login_input.clear()
+            login_input.send_keys(self.config.ha_login)
+
+            password_input = self.driver.find_element(By.NAME, "password")
+            password_input.clear()
+            password_input.send_keys(self.config.ha_password)
+
+            login_button = self.driver.find_element(
+                By.CSS_SELECTOR, ".action>mwc-button")
+            login_button.click()
+        else:
+            self._logger.info("authenticated with %s token",
+                              self.driver.execute_script(
+                                  "return window.__kioskAuth;"))
+
+        wait.until(lambda driver: driver.execute_script(
+            AUTH_STATE_SCRIPT) == "authenticated")
+        webdriver.ActionChains(self.driver).send_keys(
+            Keys.ESCAPE).perform()
+
+        if not self.first_paint_reported:
+            self._report_first_paint()
+
+    def _report_first_paint(self):
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.common.exceptions import TimeoutException
 
-    def _thread(self):
         try:
-            self._logger.info("%s thread started", self.worker_thread.name)
-
-            self.driver = webdriver.Chrome(options=self.chrome_options)
-            wait = WebDriverWait(self.driver, 20)
-
-            self.driver.get(os.getenv("HA_URL"))
-
-            self.ha_tab = self.driver.current_window_handle
-
-            if self.driver.current_url.count("auth/authorize"):
-                wait.until(EC.presence_of_element_located(
-                    (By.TAG_NAME, "ha-authorize")))
-                login_input = self.driver.find_element(By.NAME, "username")
-                login_input.clear()
-                login_input.send_keys(os.getenv("HA_LOGIN"))
-
-                password_input = self.driver.find_element(By.NAME, "password")
-                password_input.clear()
-                password_input.send_keys(os.getenv("HA_PASSWORD"))
-
-                login_button = self.driver.find_element(
-                    By.CSS_SELECTOR, ".action>mwc-button")
-                login_button.click()
-
-            wait.until(EC.presence_of_element_located(
-                (By.TAG_NAME, "home-assistant")))
-            webdriver.ActionChains(self.driver).send_keys(
-                Keys.ESCAPE).perform()
-
-            while not self.terminate:
-                time.sleep(0.5)
-                if len(self.driver.window_handles) > 1:
-                    for handle in [handle
-                                   for handle in self.driver.window_handles
-                                   if handle != self.ha_tab]:
-                        self.driver.switch_to.window(handle)
-                        self.driver.close()
+            first_paint = WebDriverWait(self.driver, 10).until(
+                lambda driver: driver.execute_script(FIRST_PAINT_SCRIPT))
+        except TimeoutException:
+            self._logger.warning("first paint timing is not available")
+            return
+        boot_to_paint = first_paint / 1000 - psutil.Process().create_time()
+        self.first_paint_reported = True
+
+        self._logger.info("boot to first paint: %.2f s", boot_to_paint)
+        self._push_sensors({"first_paint": round(boot_to_paint, 2)})
+
+    def _push_sensors(self, sensors: dict):
+        self.message_bus.put({"command": "sensors_push",
+                              "arg": {self.display.key(sensor): value
+                                      for sensor, value in sensors.items()}})
+
+    def _push_image(self, image: bytes):
+        self.message_bus.put({"command": "image_push",
+                              "arg": {"key": self.display.key("screenshot"),
+                                      "image": image}})
+
+    def _report_dashboard_ready(self):
+        self.message_bus.put({"command": "dashboard_ready",
+                              "display": self.display.name})
+
+    def _wait_dashboard(self):
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        WebDriverWait(self.driver, 30).until(lambda driver: driver.execute_script(
+            "const ha = document.querySelector('home-assistant');"
+            "return !!(ha && ha.hass && ha.hass.connected);"))
+
+    def _report_ready(self, disconnected_at):
+        self._report_dashboard_ready()
+        if disconnected_at is None:
+            boot_to_dashboard = TIMELINE.mark(self.display.key("ha_rendered"))
+            if boot_to_dashboard is not None:
+                self._logger.info("startup timeline: %s", TIMELINE.summary())
+                self._push_sensors({"boot_to_dashboard":
+                                    round(boot_to_dashboard, 2)})
+            return
 
-                if not self.message_queue.empty():
-                    message = self.message_queue.get(False)
+        recovery = time.monotonic() - disconnected_at
+        self._logger.info("dashboard restored %.1f s after disconnect",
+                          recovery)
+        self._push_sensors({"dashboard_recovery": round(recovery, 1)})
+
+    def _reload_dashboard(self):
+        self.driver.refresh()
+        self._wait_dashboard()
+
+    async def _resume(self, stop_event: asyncio.Event, disconnected_at):
+        offline = 0
+        if disconnected_at is not None:
+            offline = time.monotonic() - disconnected_at
+        if offline > self.config.browser_resume_reload_after:
+            await self.browser.reload()
+        try:
+            await self._call(self._wait_dashboard)
+        except Exception:
+            self._logger.warning("dashboard did not reconnect, reloading")
+            if not await self._until_reachable(stop_event,
+                                               self._reload_dashboard):
+                return
+        self._report_ready(disconnected_at)
+
+    def _dashboard_url(self, dashboard: str) -> str:
+        return self.display.dashboard_url(dashboard, self.config.dashboards)
+
+    def _dashboard_urls(self) -> dict:
+        return {dashboard: self._dashboard_url(dashboard)
+                for dashboard in self.config.dashboards}
+
+    async def _navigate(self, dashboard: str):
+        url = self._dashboard_url(dashboard)
+        self._logger.info("showing %s (%s)", dashboard, url)
+        await self.browser.show(url)
+        self.dashboard = dashboard
+        self._push_sensors({"dashboard": self._dashboard_option(dashboard)})
+
+    def _dashboard_option(self, dashboard: str) -> str | None:
+        if dashboard in self.config.dashboards:
+            return dashboard
+        url = self._dashboard_url(dashboard)
+        return next((name for name, dashboard_url
+                     in self._dashboard_urls().items()
+                     if dashboard_url == url), None)
+
+    async def _preload(self):
+        await self.browser.preload([url for dashboard, url
+                                    in self._dashboard_urls().items()
+                                    if dashboard != HOME_DASHBOARD])
+
+    def apply_config(self, config: Config) -> list:
+        previous = self._dashboard_urls()
+        self.config = config
+        self.watchdog.config = config
+        url = config.display_urls.get(self.display.name)
+        if url is not None and url != self.display.url:
+            self._logger.info("dashboard url changed to %s", url)
+            self.display.url = url
+
+        current = self._dashboard_urls()
+        return [(old, current[dashboard])
+                for dashboard, old in previous.items()
+                if dashboard in current and current[dashboard] != old]
+
+    async def _reconfigure(self, config: Config, changed: list):
+        origin = get_origin(self.display.url)
+        moved = self.apply_config(config)
+
+        if moved and get_origin(self.display.url) != origin:
+            await self.browser.add_script(token_script(
+                self.display.url, config.ha_access_token,
+                config.ha_refresh_token))
+        for old, url in moved:
+            await self.browser.replace_url(old, url)
+        if "dashboards" in changed:
+            await self._preload()
+            self._push_sensors(
+                {"dashboard": self._dashboard_option(self.dashboard)})
+
+    async def _session(self, stop_event: asyncio.Event,
+                       message_queue: asyncio.Queue, restarted: bool) -> bool:
+        await self._call(self._start_browser)
+        if not await self._until_reachable(stop_event, self._open_dashboard):
+            return False
+        self.beat()
+
+        self.browser = BrowserController(
+            self.driver.capabilities["goog:chromeOptions"]["debuggerAddress"],
+            self.tab_pool)
+        await self.browser.connect(self.ha_tab, self.display.url)
+        if restarted:
+            if not await self._until_reachable(stop_event,
+                                               self._wait_dashboard):
+                return False
+            self._report_dashboard_ready()
+        else:
+            self._report_ready(None)
+
+        await self._preload()
+        if self.dashboard != HOME_DASHBOARD:
+            await self._navigate(self.dashboard)
+        else:
+            self._push_sensors({"dashboard": self.dashboard})
+        if not self.page_active:
+            await self.browser.set_active(False)
+
+        pid = self.driver.service.process.pid
+        governor = BrowserGovernor(self._push_sensors, pid, self.browser,
+                                   message_queue, self.config)
+        telemetry = PageTelemetry(self._push_sensors, self.browser,
+                                  self.config)
+        telemetry.active = self.page_active
+        screenshots = ScreenshotPublisher(self._push_image, self.browser,
+                                          self.display.size, pid, self.config)
+        screenshots.active = self.page_active
+        self.watchdog.active = self.page_active
+        runners = {
+            "browser_governor": governor.run,
+            "page_telemetry": telemetry.run,
+            "screenshots": screenshots.run,
+            "renderer_watchdog": partial(self.watchdog.run, self.browser,
+                                         pid, message_queue)
+        }
+        session_tasks = {name: asyncio.create_task(run(), name=name)
+                         for name, run in runners.items()}
+        try:
+            while not stop_event.is_set():
+                message = await message_queue.get()
+                if message is None:
+                    break
 
+                try:
                     match message["command"]:
                         case "reload":
-                            self.driver.refresh()
+                            await self.browser.reload()
+                        case "navigate":
+                            await self._navigate(message["arg"])
+                        case "resume":
+                            await self._resume(
+                                stop_event, message["arg"]["disconnected_at"])
+                        case "page_visibility":
+                            await self.browser.set_active(message["arg"])
+                            telemetry.active = message["arg"]
+                            screenshots.active = message["arg"]
+                            self.watchdog.active = message["arg"]
+                        case "config_changed":
+                            await self._reconfigure(message["arg"]["config"],
+                                                    message["arg"]["changed"])
+                            for part in (governor, telemetry, screenshots):
+                                part.config = self.config
+                            for name, run in runners.items():
+                                if session_tasks[name].done():
+                                    session_tasks[name] = asyncio.create_task(
+                                        run(), name=name)
+                        case "restart":
+                            return True
+                finally:
+                    self.message_bus.complete(message)
+            return False
+        finally:
+            for task in session_tasks.values():
+                task.cancel()
+            await asyncio.gather(*session_tasks.values(),
+                                 return_exceptions=True)
+            await self._close_session()
+
+    async def _close_session(self):
+        if self.browser is not None:
+            await self.browser.close()
+            self.browser = None
+        if self.driver is not None:
+            await self._call(self.driver.quit)
+            self.driver = None
+
+    async def _run(self, previous_task, stop_event: asyncio.Event,
+                   message_queue: asyncio.Queue):
+        if previous_task is not None:
+            await asyncio.gather(previous_task, return_exceptions=True)
+        if stop_event.is_set():
+            return
+
+        try:
+            self._logger.info("chrome task started")
 
-            self.driver.quit()
+            restarted = False
+            while await self._session(stop_event, message_queue, restarted):
+                self._logger.info("restarting browser")
+                self.restarts += 1
+                self._push_sensors({"browser_restarts": self.restarts})
+                restarted = True
 
-            self._logger.info("%s thread stopped", self.worker_thread.name)
+            self._logger.info("chrome task stopped")
         except Exception:
-            self._logger.exception("%s fatal exception in thread",
-                                   self.worker_thread.name, exc_info=True)
+            self._logger.exception("fatal exception in chrome task",
+                                   exc_info=True)
+        finally:
+            await self._close_session()
@@ -0,0 +1,109 @@
+import queue
+import logging
+import logging.handlers
+from collections import deque
+
+LOG_FORMAT = "%(asctime)s - (%(levelname)s) [%(name)s]: %(message)s"
+LOG_DATE_FORMAT = "%d-%m-%Y %H:%M:%S"
+NOISY_LOGGERS = ["websockets", "urllib3", "selenium", "asyncio"]
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        return record
+
+
+class RingBufferHandler(logging.Handler):
+    def __init__(self, capacity: int, target: logging.Handler,
+                 flush_level: int = logging.ERROR):
+        super().__init__(logging.DEBUG)
+        self.records = deque(maxlen=capacity)
+        self.target = target
+        self.flush_level = flush_level
+
+    def emit(self, record):
+        reason = getattr(record, "dump_reason", None)
+        if reason is not None:
+            self._flush_locked(reason)
+            return
+        if record.levelno >= self.flush_level:
+            self._flush_locked(f"{record.levelname.lower()} in {record.name}")
+            return
+        self.records.append(record)
+
+    def _flush_locked(self, reason: str):
+        records = [record for record in self.records
+                   if record.levelno < self.target.level]
+        self.records.clear()
+        if not records:
+            return
+        self.target.handle(logging.makeLogRecord({
+            "name": "LogPipeline", "levelno": logging.INFO,
+            "levelname": "INFO",
+            "msg": "dumping %d buffered records (%s)",
+            "args": (len(records), reason)}))
+        for record in records:
+            self.target.handle(record)
+        self.target.flush()
+
+
+class LogPipeline:
+    def __init__(self):
+        self.listener = None
+        self.queue = None
+        self.ring = None
+        self.outputs = []
+
+    def setup(self, config):
+        level = config.log_level
+        formatter = logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+
+        file_handler = logging.handlers.RotatingFileHandler(
+            config.log_file,
+            maxBytes=config.log_max_bytes,
+            backupCount=config.log_backup_count,
+            delay=True)
+        file_handler.setLevel(level)
+        file_handler.setFormatter(formatter)
+
+        stream_handler = logging.StreamHandler()
+        stream_handler.setLevel(level)
+        stream_handler.setFormatter(formatter)
+
+        self.outputs = [file_handler, stream_handler]
+        handlers = list(self.outputs)
+        if config.log_ring_size > 0:
+            self.ring = RingBufferHandler(config.log_ring_size, file_handler)
+            handlers.insert(0, self.ring)
+
+        self.queue = queue.SimpleQueue()
+        self.listener = logging.handlers.QueueListener(
+            self.queue, *handlers, respect_handler_level=True)
+
+        logging.getLogger().handlers = [LazyQueueHandler(self.queue)]
+        self.set_level(level)
+        self.listener.start()
+
+    def set_level(self, level: int):
+        for handler in self.outputs:
+            handler.setLevel(level)
+        logging.getLogger().setLevel(
+            logging.DEBUG if self.ring is not None else level)
+        for name in NOISY_LOGGERS:
+            logging.getLogger(name).setLevel(max(logging.INFO, level))
+
+    def dump(self, reason: str):
+        if self.ring is None or self.listener is None:
+            return
+        self.queue.put(logging.makeLogRecord({
+            "name": "LogPipeline", "levelno": logging.DEBUG,
+            "levelname": "DEBUG", "msg": "log dump requested: %s",
+            "args": (reason,), "dump_reason": reason}))
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+
+LOGS = LogPipeline()
@@ -0,0 +1,94 @@
+import asyncio
+import inspect
+import time
+import logging
+from collections import defaultdict, deque
+from threading import Lock
+
+from workers.metrics import METRICS
+
+LATENCY_WINDOW = 256
+QUEUE_SIZE = 256
+
+
+class MessageBus:
+    def __init__(self):
+        self._logger = logging.getLogger("MessageBus")
+
+        self.loop = None
+        self.message_queue = None
+        self.subscribers = defaultdict(list)
+
+        self.latency = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+        self.latency_lock = Lock()
+
+        self.worker_task = None
+
+    def subscribe(self, commands: list, handler):
+        for command in commands:
+            self.subscribers[command].append(handler)
+
+    def put(self, message):
+        if "ts" not in message:
+            message["ts"] = time.monotonic()
+        self.loop.call_soon_threadsafe(self.message_queue.put_nowait, message)
+
+    def complete(self, message):
+        if "ts" not in message:
+            return
+        elapsed = time.monotonic() - message["ts"]
+        with self.latency_lock:
+            self.latency[message["command"]].append(elapsed)
+        self._logger.debug("%s handled in %.1f ms",
+                           message["command"], elapsed * 1000)
+
+    def latency_stats(self) -> dict:
+        stats = {}
+        with self.latency_lock:
+            samples = {command: sorted(values)
+                       for command, values in self.latency.items() if values}
+        for command, values in samples.items():
+            stats[command] = {
+                "count": len(values),
+                "p50": values[len(values) // 2],
+                "p99": values[min(len(values) - 1, int(len(values) * 0.99))],
+                "max": values[-1]
+            }
+        return stats
+
+    def start(self):
+        if self.worker_task is not None and not self.worker_task.done():
+            return
+        self.loop = asyncio.get_running_loop()
+        self.message_queue = METRICS.queue("message_bus", QUEUE_SIZE)
+        self.worker_task = asyncio.create_task(self._run(),
+                                               name="message_bus")
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.message_queue.put_nowait, None)
+
+    async def wait_closed(self):
+        await self.worker_task
+
+    async def _run(self):
+        while True:
+            message = await self.message_queue.get()
+            if message is None:
+                break
+
+            self._logger.debug("New message %s", message)
+
+            handlers = self.subscribers.get(message["command"])
+            if not handlers:
+                self._logger.debug("no subscribers for %s",
+                                   message["command"])
+                continue
+
+            for handler in handlers:
+                try:
+                    result = handler(message)
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception:
+                    self._logger.exception("handler for %s failed",
+                                           message["command"], exc_info=True)
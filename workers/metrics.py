@@ -0,0 +1,123 @@
+import asyncio
+import time
+import logging
+
+import psutil
+
+LAG_PROBE_INTERVAL = 1
+
+
+class MeteredQueue(asyncio.Queue):
+    def __init__(self, name: str, maxsize: int = 0):
+        super().__init__(maxsize)
+        self._logger = logging.getLogger("MeteredQueue")
+
+        self.name = name
+        self.high_water = 0
+        self.dropped = 0
+
+    def put_nowait(self, item):
+        if item is None and self.full():
+            self.get_nowait()
+            self.dropped += 1
+
+        try:
+            super().put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self._logger.warning("%s queue is full, dropping %s",
+                                 self.name, item.get("command"))
+            return
+
+        self.high_water = max(self.high_water, self.qsize())
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.queues = {}
+
+    def queue(self, name: str, maxsize: int = 0) -> MeteredQueue:
+        self.queues[name] = MeteredQueue(name, maxsize)
+        return self.queues[name]
+
+    def queue_stats(self) -> dict:
+        return {name: {"depth": queue.qsize(),
+                       "high_water": queue.high_water,
+                       "dropped": queue.dropped}
+                for name, queue in self.queues.items()}
+
+
+METRICS = MetricsRegistry()
+
+
+class MetricsWorker:
+    HANDLED_COMMANDS = ["config_changed"]
+
+    def __init__(self, message_bus, mqtt_worker, config):
+        self._logger = logging.getLogger("MetricsWorker")
+
+        self.message_bus = message_bus
+        self.mqtt_worker = mqtt_worker
+        self.config = config
+
+        self.process = psutil.Process()
+        self.loop_lag = 0
+        self.worker_tasks = []
+
+    def start(self):
+        if self.worker_tasks:
+            return
+        self.process.cpu_percent(None)
+        self.worker_tasks = [
+            asyncio.create_task(self._lag_probe(), name="metrics_lag_probe"),
+            asyncio.create_task(self._timer(), name="metrics_timer")
+        ]
+
+    async def stop(self):
+        for task in self.worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self.worker_tasks, return_exceptions=True)
+        self.worker_tasks = []
+
+    def push_command(self, message):
+        self.config = message["arg"]["config"]
+
+    async def _lag_probe(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(LAG_PROBE_INTERVAL)
+            lag = time.monotonic() - started - LAG_PROBE_INTERVAL
+            self.loop_lag = max(self.loop_lag, lag)
+
+    def _collect(self) -> dict:
+        queues = METRICS.queue_stats()
+        latency = self.message_bus.latency_stats()
+
+        self._logger.debug("queues: %s", queues)
+
+        metrics = {
+            "queue_depth": max((queue["depth"] for queue in queues.values()),
+                               default=0),
+            "queue_high_water": max((queue["high_water"]
+                                     for queue in queues.values()), default=0),
+            "dropped_commands": sum(queue["dropped"]
+                                    for queue in queues.values()),
+            "queues": {name: {"high_water": queue["high_water"],
+                              "dropped": queue["dropped"]}
+                       for name, queue in queues.items()},
+            "command_latency": round(max((stats["p99"]
+                                          for stats in latency.values()),
+                                         default=0) * 1000, 1),
+            "loop_lag": round(self.loop_lag * 1000, 1),
+            "mqtt_publishes": self.mqtt_worker.publish_counts["state"],
+            "process_rss": round(self.process.memory_info().rss / 1048576, 1),
+            "process_cpu": round(self.process.cpu_percent(None), 1)
+        }
+        self.loop_lag = 0
+        return metrics
+
+    async def _timer(self):
+        while True:
+            await asyncio.sleep(self.config.metrics_interval)
+            self.message_bus.put({"command": "sensors_push",
+                                  "arg": self._collect()})
@@ -0,0 +1,58 @@
+import asyncio
+import socket
+import threading
+import paho.mqtt.client as mqtt
+
+MISC_LOOP_INTERVAL = 1
+
+
+class AsyncioMQTTAdapter:
+    def __init__(self, loop: asyncio.AbstractEventLoop, client: mqtt.Client,
+                 on_closed=None):
+        self.loop = loop
+        self.loop_thread = threading.get_ident()
+        self.client = client
+        self.on_closed = on_closed
+        self.misc_task = None
+
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+
+    def _call(self, callback, *args):
+        if threading.get_ident() == self.loop_thread:
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def _on_socket_open(self, client: mqtt.Client, userdata, sock: socket.socket):
+        self._call(self._attach, sock.fileno())
+
+    def _on_socket_close(self, client: mqtt.Client, userdata, sock: socket.socket):
+        self._call(self._detach, sock.fileno())
+
+    def _on_socket_register_write(self, client: mqtt.Client, userdata,
+                                  sock: socket.socket):
+        self._call(self.loop.add_writer, sock.fileno(), self.client.loop_write)
+
+    def _on_socket_unregister_write(self, client: mqtt.Client, userdata,
+                                    sock: socket.socket):
+        self._call(self.loop.remove_writer, sock.fileno())
+
+    def _attach(self, fd: int):
+        self.loop.add_reader(fd, self.client.loop_read)
+        self.misc_task = self.loop.create_task(self._misc_loop())
+
+    def _detach(self, fd: int):
+        self.loop.remove_reader(fd)
+        self.loop.remove_writer(fd)
+        if self.misc_task is not None:
+            self.misc_task.cancel()
+            self.misc_task = None
+        if self.on_closed is not None:
+            self.on_closed()
+
+    async def _misc_loop(self):
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(MISC_LOOP_INTERVAL)
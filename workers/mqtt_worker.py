@@ -1,27 +1,47 @@
 import paho.mqtt.client as mqtt
 import paho.mqtt.reasoncodes as reasoncodes
 import paho.mqtt.packettypes as packettypes
-import os
-import queue
+import asyncio
 import json
 import platform
+import random
 import time
 import logging
-import threading
 import __version__
 
 from const.available_commands import AVAILABLE_COMMANDS
-from const.sensors import HA_ENTITIES
+from const.sensors import (
+    HA_ENTITIES,
+    SENSOR_OPTIONS,
+    DISPLAY_ENTITIES,
+    DISPLAY_PAYLOADS
+)
+from workers.displays import load_displays, base_key
+from workers.mqtt_asyncio import AsyncioMQTTAdapter
+from workers.startup_timeline import TIMELINE
+from workers.metrics import METRICS
+from workers.config import Config
+
+HA_STATUS_TOPIC = "homeassistant/status"
+DISCONNECT_TIMEOUT = 2
+CONNECTION_FIELDS = ["mqtt_host", "mqtt_port", "mqtt_username",
+                     "mqtt_password"]
+DISCOVERY_FIELDS = ["dashboards", "screenshot_interval"]
+QUEUE_SIZE = 64
 
 
 class MQTTWorker:
-    def __init__(self, UNIQUE_ID: str, MAC_ADDR: str,
-                 MESSAGE_QUEUE: queue.Queue):
+    HANDLED_COMMANDS = ["sensors_push", "image_push", "config_changed"]
+
+    def __init__(self, UNIQUE_ID: str, MAC_ADDR: str, message_bus,
+                 displays=None, config=None):
         self._logger = logging.getLogger("MQTTWorker")
 
         self.UNIQUE_ID = UNIQUE_ID
         self.MAC_ADDR = MAC_ADDR
-        self.MESSAGE_QUEUE = MESSAGE_QUEUE
+        self.message_bus = message_bus
+        self.config = config or Config.from_env()
+        self.displays = displays or load_displays(self.config)
 
         self.BASE_TOPIC = f"homeassistant/device/{self.UNIQUE_ID}/"
         self.COMMAND_TOPIC = self.BASE_TOPIC + "command"
@@ -29,9 +49,24 @@ class MQTTWorker:
         self.AVAILABILITY_TOPIC = self.BASE_TOPIC + "availability"
 
         self.sensors_data = {}
+        self.published_data = {}
+        self.last_publish = time.monotonic()
+        self.publish_counts = {"state": 0, "suppressed": 0, "image": 0,
+                               "discovery": 0}
+
+        self.reconnect_attempt = 0
+        self.discovery_payload = None
+        self.discovery_published = False
+        self.discovery_handle = None
+        self.pending_images = {}
+        self.disabled_entities = set()
+        self._set_disabled_entities()
 
-        self.worker_queue = queue.Queue()
-        self.worker_thread = None
+        self.terminate = False
+        self.loop = None
+        self.worker_queue = None
+        self.disconnected = None
+        self.worker_tasks = []
 
         self.mqtt_client = mqtt.Client(
             mqtt.CallbackAPIVersion.VERSION2, UNIQUE_ID, protocol=mqtt.MQTTv5)
@@ -39,38 +74,139 @@ class MQTTWorker:
         self.mqtt_client.on_connect = self._on_connect
         self.mqtt_client.on_message = self._on_message
 
-        if os.getenv("MQTT_USERNAME") is not None and os.getenv("MQTT_PASSWORD") is not None:
-            self.mqtt_client.username_pw_set(
-                os.getenv("MQTT_USERNAME"), os.getenv("MQTT_PASSWORD"))
+        self._set_credentials()
 
         self.mqtt_client.will_set(self.AVAILABILITY_TOPIC,
                                   payload="offline", retain=True)
 
-    def start(self):
+    def _set_credentials(self):
+        if self.config.mqtt_username is not None and \
+                self.config.mqtt_password is not None:
+            self.mqtt_client.username_pw_set(self.config.mqtt_username,
+                                             self.config.mqtt_password)
+        else:
+            self.mqtt_client.username_pw_set(None)
+
+    def _set_disabled_entities(self):
+        self.disabled_entities.discard("screenshot")
+        if self.config.screenshot_interval <= 0:
+            self.disabled_entities.add("screenshot")
+
+    def _apply_config(self, config: Config, changed: list):
+        host_changed = config.mqtt_host != self.config.mqtt_host or \
+            config.mqtt_port != self.config.mqtt_port
+        self.config = config
+        if any(field in DISCOVERY_FIELDS for field in changed):
+            self._logger.info("entities changed, republishing discovery")
+            self._set_disabled_entities()
+            self.discovery_payload = None
+            self.discovery_published = False
+            self._ha_discovery()
+        if not any(field in CONNECTION_FIELDS for field in changed):
+            return
+
+        self._logger.info("broker settings changed, reconnecting to %s:%d",
+                          config.mqtt_host, config.mqtt_port)
+        self._set_credentials()
+        if host_changed:
+            self.discovery_published = False
+        self.reconnect_attempt = 0
         if self.mqtt_client.is_connected():
+            self.mqtt_client.disconnect()
+
+    def start(self):
+        if self.worker_tasks:
             return
 
-        self.worker_thread = threading.Thread(
-            target=self._timer, name="mqtt_send_timer")
-        self.mqtt_client.connect_async(os.getenv("MQTT_HOST"),
-                                       int(os.getenv("MQTT_PORT")))
+        self.terminate = False
+        self.loop = asyncio.get_running_loop()
+        self.worker_queue = METRICS.queue("mqtt", QUEUE_SIZE)
+        self.disconnected = asyncio.Event()
+        AsyncioMQTTAdapter(self.loop, self.mqtt_client,
+                           on_closed=self.disconnected.set)
 
-        self.mqtt_client.loop_start()
+        self.worker_tasks = [
+            asyncio.create_task(self._connection_loop(), name="mqtt_connection"),
+            asyncio.create_task(self._timer(), name="mqtt_send_timer")
+        ]
         self._logger.info("started")
 
-    def stop(self):
-        if not self.mqtt_client.is_connected():
+    async def stop(self):
+        if self.terminate:
             return
-
-        self.mqtt_client.loop_stop()
-        self.mqtt_client.disconnect(reasoncode=reasoncodes.ReasonCode(
-            packettypes.PacketTypes.DISCONNECT, "Disconnect", 4))
+        self.terminate = True
         self._logger.info("stop requested")
 
+        if self.discovery_handle is not None:
+            self.discovery_handle.cancel()
+        self.worker_queue.put_nowait(None)
+        if self.mqtt_client.is_connected():
+            self.mqtt_client.disconnect(reasoncode=reasoncodes.ReasonCode(
+                packettypes.PacketTypes.DISCONNECT, "Disconnect", 4))
+            try:
+                await asyncio.wait_for(self.disconnected.wait(),
+                                       DISCONNECT_TIMEOUT)
+            except TimeoutError:
+                self._logger.warning("broker did not close the connection")
+
+        for task in self.worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self.worker_tasks, return_exceptions=True)
+        self.worker_tasks = []
+
     def push_command(self, message):
-        self.worker_queue.put(message)
+        self.worker_queue.put_nowait(message)
+
+    def is_alive(self) -> bool:
+        return self.terminate or not any(task.done()
+                                         for task in self.worker_tasks)
 
-    def _ha_discovery(self, client: mqtt.Client):
+    async def restart(self):
+        await self.stop()
+        self.start()
+
+    async def _connection_loop(self):
+        while not self.terminate:
+            self.disconnected.clear()
+            try:
+                await self.loop.run_in_executor(None, self.mqtt_client.connect,
+                                                self.config.mqtt_host,
+                                                self.config.mqtt_port)
+                await self.disconnected.wait()
+                if self.terminate:
+                    break
+                self._logger.warning("mqtt connection lost")
+            except OSError as e:
+                self._logger.warning("mqtt connection failed: %s", e)
+            await asyncio.sleep(self._reconnect_delay())
+
+    def _reconnect_delay(self) -> float:
+        ceiling = min(self.config.mqtt_reconnect_max,
+                      self.config.mqtt_reconnect_min * 2 ** self.reconnect_attempt)
+        self.reconnect_attempt += 1
+        delay = random.uniform(self.config.mqtt_reconnect_min / 2, ceiling)
+        self._logger.info("reconnecting in %.1f s (attempt %d)",
+                          delay, self.reconnect_attempt)
+        return delay
+
+    def _ha_discovery(self):
+        self.discovery_handle = None
+        if not self.mqtt_client.is_connected():
+            return
+        if self.discovery_payload is None:
+            self.discovery_payload = self._build_discovery()
+        self.mqtt_client.publish(self.BASE_TOPIC + "config",
+                                 self.discovery_payload, retain=True)
+        self.discovery_published = True
+        self.publish_counts["discovery"] += 1
+
+    def _schedule_discovery(self):
+        if self.discovery_handle is not None:
+            return
+        self.discovery_handle = self.loop.call_later(
+            random.uniform(0, self.config.mqtt_discovery_jitter), self._ha_discovery)
+
+    def _build_discovery(self) -> str:
         template = {
             "dev": {
                 "identifiers": [
@@ -96,40 +232,156 @@ class MQTTWorker:
         }
 
         for sensor in HA_ENTITIES:
+            if sensor in self.disabled_entities:
+                continue
             template["components"][f"{
                 self.UNIQUE_ID}-{sensor}"] = dict.copy(HA_ENTITIES[sensor])
             template["components"][f"{
                 self.UNIQUE_ID}-{sensor}"]["unique_id"] = f"{self.UNIQUE_ID}-{sensor}"
+            if "json_attributes_template" in HA_ENTITIES[sensor]:
+                template["components"][f"{
+                    self.UNIQUE_ID}-{sensor}"]["json_attributes_topic"] = \
+                    self.STATE_TOPIC
+        template["components"][f"{self.UNIQUE_ID}-dashboard"]["options"] = \
+            list(self.config.dashboards)
+        if "screenshot" not in self.disabled_entities:
+            template["components"][f"{self.UNIQUE_ID}-screenshot"]["topic"] = \
+                self._image_topic("screenshot")
+
+        for display in self.displays:
+            if display.primary:
+                continue
+            for sensor in DISPLAY_ENTITIES:
+                if sensor in self.disabled_entities:
+                    continue
+                unique_id = f"{self.UNIQUE_ID}-{display.name}-{sensor}"
+                component = self._display_component(display, sensor)
+                component["unique_id"] = unique_id
+                template["components"][unique_id] = component
+
+        return json.dumps(template)
 
-        client.publish(self.BASE_TOPIC + "config",
-                       json.dumps(template), retain=True)
+    def _display_component(self, display, sensor: str) -> dict:
+        component = dict.copy(HA_ENTITIES[sensor])
+        if "options" in component:
+            component["options"] = list(self.config.dashboards)
+        if "topic" in component:
+            component["topic"] = self._image_topic(display.key(sensor))
+        component["name"] = f"{component["name"]} ({display.name})"
+        component["value_template"] = component.get(
+            "value_template", "").replace(f"value_json.{sensor}",
+                                          f"value_json.{display.key(sensor)}")
+        if not component["value_template"]:
+            del component["value_template"]
+        for payload in DISPLAY_PAYLOADS:
+            if payload in component:
+                component[payload] = component[payload].replace(
+                    '{"command": ', f'{{"display": "{display.name}", "command": ', 1)
+        return component
 
     def _on_connect(self, client: mqtt.Client, userdata, flags, reason_code, properties):
-        self._logger.info(f"mqtt connected with result code {reason_code}")
-        client.subscribe(self.COMMAND_TOPIC)
+        self._logger.info("mqtt connected with result code %s", reason_code)
+        if reason_code.is_failure:
+            return
+        TIMELINE.mark("mqtt_connected")
+        self.reconnect_attempt = 0
+        client.subscribe([(self.COMMAND_TOPIC, 0), (HA_STATUS_TOPIC, 0)])
         client.publish(self.AVAILABILITY_TOPIC, "online", 0, True)
-        self._ha_discovery(client)
-
-        if not self.worker_thread.is_alive():
-            self.worker_thread.start()
+        if not self.discovery_published:
+            self._ha_discovery()
+        self.worker_queue.put_nowait({"command": "state_refresh"})
 
     def _on_message(self, client: mqtt.Client, userdata, message: mqtt.MQTTMessage):
-        if message.topic == self.COMMAND_TOPIC:
+        if message.topic == HA_STATUS_TOPIC:
+            if message.payload == b"online" and \
+                    not (message.retain and self.discovery_published):
+                self._logger.info("home assistant is online, "
+                                  "republishing discovery")
+                self._schedule_discovery()
+        elif message.topic == self.COMMAND_TOPIC:
             try:
                 msg = json.loads(message.payload)
                 if msg["command"] in AVAILABLE_COMMANDS:
-                    self.MESSAGE_QUEUE.put(msg)
+                    msg["ts"] = time.monotonic()
+                    self.message_bus.put(msg)
             except json.JSONDecodeError:
                 pass
 
-    def _timer(self):
-        while self.mqtt_client.is_connected():
-            time.sleep(0.1)
-            while not self.worker_queue.empty():
-                message = self.worker_queue.get()
-                if message["command"] == "sensors_push":
+    def _is_changed(self, sensor, value) -> bool:
+        if sensor not in self.published_data:
+            return True
+        old_value = self.published_data[sensor]
+        deadband = SENSOR_OPTIONS.get(base_key(sensor), {}).get("deadband", 0)
+        if isinstance(value, (int, float)) and isinstance(old_value, (int, float)):
+            return value != old_value and abs(value - old_value) >= deadband
+        return value != old_value
+
+    def _next_publish_timeout(self, publish_at):
+        if publish_at is not None:
+            return max(0, publish_at - time.monotonic())
+        if self.config.mqtt_state_heartbeat > 0:
+            return max(0, self.last_publish +
+                       self.config.mqtt_state_heartbeat - time.monotonic())
+        return None
+
+    def _publish_state(self):
+        self.last_publish = time.monotonic()
+        if not self.mqtt_client.is_connected():
+            return
+
+        self.mqtt_client.publish(self.STATE_TOPIC,
+                                 json.dumps(self.sensors_data),
+                                 retain=True)
+        self.published_data = dict(self.sensors_data)
+        self.publish_counts["state"] += 1
+        self._logger.debug("state published, counts: %s", self.publish_counts)
+
+    def _image_topic(self, key: str) -> str:
+        return self.BASE_TOPIC + key
+
+    def _publish_image(self, key: str, image: bytes):
+        if not self.mqtt_client.is_connected():
+            self.pending_images[key] = image
+            return
+        self.mqtt_client.publish(self._image_topic(key), image, retain=True)
+        self.publish_counts["image"] += 1
+
+    async def _timer(self):
+        publish_at = None
+        while True:
+            try:
+                message = await asyncio.wait_for(
+                    self.worker_queue.get(),
+                    self._next_publish_timeout(publish_at))
+            except TimeoutError:
+                self._publish_state()
+                publish_at = None
+                continue
+
+            if message is None:
+                break
+
+            match message["command"]:
+                case "sensors_push":
+                    changed = [sensor for sensor, value in message["arg"].items()
+                               if self._is_changed(sensor, value)]
                     self.sensors_data.update(message["arg"])
+                    if not changed:
+                        self.publish_counts["suppressed"] += 1
+                    elif publish_at is None:
+                        publish_at = time.monotonic() + \
+                            self.config.mqtt_state_coalesce
+                case "state_refresh":
+                    publish_at = time.monotonic()
+                    pending_images, self.pending_images = \
+                        self.pending_images, {}
+                    for key, image in pending_images.items():
+                        self._publish_image(key, image)
+                case "image_push":
+                    self._publish_image(message["arg"]["key"],
+                                        message["arg"]["image"])
+                case "config_changed":
+                    self._apply_config(message["arg"]["config"],
+                                       message["arg"]["changed"])
 
-            self.mqtt_client.publish(self.STATE_TOPIC,
-                                     json.dumps(self.sensors_data),
-                                     retain=True)
+            self.message_bus.complete(message)
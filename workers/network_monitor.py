@@ -0,0 +1,106 @@
+import asyncio
+import logging
+
+FALLBACK_POLL_INTERVAL = 30
+RESOLVE_RETRY_INTERVAL = 5
+
+
+class NetworkMonitor:
+    def __init__(self, message_bus, ifname: str):
+        self._logger = logging.getLogger("NetworkMonitor")
+
+        self.message_bus = message_bus
+        self.ifname = ifname
+
+        self.sdbus = None
+        self.device = None
+        self.active_connection_path = None
+        self.active_connection_name = ""
+        self.last_state = None
+
+        self.worker_tasks = []
+
+    def start(self):
+        if self.worker_tasks:
+            return
+        if self.sdbus is None:
+            import sdbus
+
+            self.sdbus = sdbus.sd_bus_open_system()
+
+        self.worker_tasks = [
+            asyncio.create_task(self._watch_signal(), name="network_signal"),
+            asyncio.create_task(self._poll(), name="network_poll")
+        ]
+        self._logger.info("started")
+
+    async def stop(self):
+        for task in self.worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self.worker_tasks, return_exceptions=True)
+        self.worker_tasks = []
+        self._logger.info("stopped")
+
+    async def _get_device(self):
+        from sdbus_async.networkmanager import (
+            NetworkManager,
+            NetworkDeviceGeneric
+        )
+
+        if self.device is None:
+            nm = NetworkManager(self.sdbus)
+            path = await nm.get_device_by_ip_iface(self.ifname)
+            self.device = NetworkDeviceGeneric(path, self.sdbus)
+            self.active_connection_path = None
+        return self.device
+
+    async def _get_connection_name(self) -> str:
+        from sdbus_async.networkmanager import ActiveConnection
+
+        path = await self.device.active_connection
+        if path == "/":
+            self.active_connection_path = None
+            self.active_connection_name = ""
+        elif path != self.active_connection_path:
+            self.active_connection_path = path
+            self.active_connection_name = await ActiveConnection(
+                path, self.sdbus).id
+        return self.active_connection_name
+
+    async def _update_state(self, state: int):
+        if state == self.last_state:
+            return
+        self.last_state = state
+
+        self.message_bus.put({
+            "command": "if_state",
+            "arg": {
+                "state": state,
+                "name": await self._get_connection_name()
+            }
+        })
+
+    async def _watch_signal(self):
+        while True:
+            try:
+                device = await self._get_device()
+                await self._update_state(await device.state)
+                async for new_state, _, _ in device.state_changed:
+                    await self._update_state(new_state)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._logger.warning("device %s unavailable, retrying",
+                                     self.ifname, exc_info=True)
+                self.device = None
+                await asyncio.sleep(RESOLVE_RETRY_INTERVAL)
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(FALLBACK_POLL_INTERVAL)
+            try:
+                device = await self._get_device()
+                await self._update_state(await device.state)
+            except Exception:
+                self._logger.debug("fallback poll failed", exc_info=True)
+                self.device = None
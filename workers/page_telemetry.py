@@ -0,0 +1,144 @@
+import asyncio
+import logging
+
+from workers.cdp import CDPError
+
+FPS_SAMPLE_DURATION = 1000
+JANK_THRESHOLD = 50
+PAGE_HISTORY = 16
+
+TELEMETRY_SCRIPT = """
+(() => {
+    if (window.__kioskTelemetry) return;
+    const early = document.readyState === "loading";
+    const state = {longTasks: 0, longTaskTime: 0, jankFrames: 0,
+                   sockets: 0, worst: null, worstDuration: 0};
+
+    const observe = (type, handler) => {
+        try {
+            new PerformanceObserver(list => list.getEntries().forEach(handler))
+                .observe({type, buffered: true});
+            return true;
+        } catch (e) {
+            return false;
+        }
+    };
+    observe("longtask", entry => {
+        state.longTasks += 1;
+        state.longTaskTime += entry.duration;
+    });
+    observe("long-animation-frame", entry => {
+        if (entry.blockingDuration < %(jank)d) return;
+        state.jankFrames += 1;
+        if (entry.duration > state.worstDuration) {
+            const script = (entry.scripts || [])[0];
+            state.worstDuration = entry.duration;
+            state.worst = script ? (script.invoker || script.sourceURL) : null;
+        }
+    });
+
+    const NativeWebSocket = window.WebSocket;
+    window.WebSocket = function (url, protocols) {
+        if (String(url).includes("/api/websocket")) state.sockets += 1;
+        return new NativeWebSocket(url, protocols);
+    };
+    window.WebSocket.prototype = NativeWebSocket.prototype;
+    Object.assign(window.WebSocket, NativeWebSocket);
+
+    const sampleFps = () => new Promise(resolve => {
+        let frames = 0;
+        const started = performance.now();
+        const tick = now => {
+            if (now - started >= %(fps)d) {
+                resolve(Math.round(frames * 1000 / (now - started)));
+                return;
+            }
+            frames += 1;
+            requestAnimationFrame(tick);
+        };
+        requestAnimationFrame(tick);
+    });
+
+    window.__kioskTelemetry = async () => {
+        const navigation = performance.getEntriesByType("navigation")[0];
+        const summary = {
+            load: navigation ? navigation.loadEventEnd : null,
+            longTasks: state.longTasks,
+            longTaskTime: Math.round(state.longTaskTime),
+            jankFrames: state.jankFrames,
+            page: performance.timeOrigin,
+            early,
+            sockets: state.sockets,
+            worst: state.worst,
+            fps: document.hidden ? 0 : await sampleFps()
+        };
+        Object.assign(state, {longTasks: 0, longTaskTime: 0, jankFrames: 0,
+                              worst: null, worstDuration: 0});
+        return summary;
+    };
+})();
+""" % {"jank": JANK_THRESHOLD, "fps": FPS_SAMPLE_DURATION}
+
+
+class PageTelemetry:
+    def __init__(self, push_sensors, browser, config):
+        self._logger = logging.getLogger("PageTelemetry")
+
+        self.push_sensors = push_sensors
+        self.browser = browser
+        self.config = config
+        self.active = True
+        self.reconnects = 0
+        self.pages = {}
+
+    async def _collect(self) -> dict:
+        summary = await self.browser.evaluate(
+            "window.__kioskTelemetry ? window.__kioskTelemetry() : null")
+        metrics = await self.browser.performance_metrics()
+        if summary is None:
+            return {}
+
+        reconnects = max(0, summary["sockets"] - int(summary["early"]))
+        self.reconnects += reconnects - self.pages.pop(summary["page"], 0)
+        self.pages[summary["page"]] = reconnects
+        if len(self.pages) > PAGE_HISTORY:
+            del self.pages[next(iter(self.pages))]
+        if summary["worst"]:
+            self._logger.info("worst frame blocked by %s", summary["worst"])
+
+        sensors = {
+            "long_tasks": summary["longTasks"],
+            "long_task_time": summary["longTaskTime"],
+            "jank_frames": summary["jankFrames"],
+            "page_fps": summary["fps"],
+            "ws_reconnects": self.reconnects,
+            "js_heap": round(metrics.get("JSHeapUsedSize", 0) / 1048576, 1)
+        }
+        if summary["load"]:
+            sensors["page_load"] = round(summary["load"] / 1000, 2)
+        return sensors
+
+    def enabled(self) -> bool:
+        return self.config.page_telemetry_interval > 0
+
+    async def run(self):
+        if not self.enabled():
+            return
+        await self.browser.add_script(TELEMETRY_SCRIPT)
+        await self.browser.enable_performance()
+
+        while True:
+            await asyncio.sleep(self.config.page_telemetry_interval)
+            if not self.enabled():
+                return
+            if not self.active:
+                continue
+            try:
+                sensors = await self._collect()
+            except (CDPError, asyncio.TimeoutError):
+                self._logger.debug("telemetry collection failed",
+                                   exc_info=True)
+                continue
+            self._logger.debug("page telemetry: %s", sensors)
+            if sensors:
+                self.push_sensors(sensors)
@@ -0,0 +1,104 @@
+import asyncio
+import time
+import logging
+
+import psutil
+
+from workers.cdp import CDPError
+from workers.log_pipeline import LOGS
+from workers.supervisor import SUPERVISOR
+
+RECOVERY_STEPS = ["reload", "renderer", "browser", "process"]
+
+
+def kill_browser(pid: int, renderers_only: bool = False) -> int:
+    try:
+        root = psutil.Process(pid)
+        processes = root.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return 0
+    if not renderers_only:
+        processes.append(root)
+
+    killed = 0
+    for process in processes:
+        try:
+            if renderers_only and "--type=renderer" not in process.cmdline():
+                continue
+            process.kill()
+            killed += 1
+        except psutil.NoSuchProcess:
+            continue
+    return killed
+
+
+class RendererWatchdog:
+    def __init__(self, name: str, beat, config):
+        self._logger = logging.getLogger("RendererWatchdog")
+
+        self.name = name
+        self.beat = beat
+        self.config = config
+
+        self.active = True
+        self.step = 0
+        self.failing_since = None
+
+    async def _probe(self, browser) -> bool:
+        try:
+            return await browser.evaluate("1", timeout=self.config.renderer_deadline) == 1
+        except (CDPError, asyncio.TimeoutError):
+            self._logger.debug("liveness probe failed", exc_info=True)
+            return False
+
+    async def _recover(self, browser, pid: int, message_queue):
+        step = RECOVERY_STEPS[min(self.step, len(RECOVERY_STEPS) - 1)]
+        self.step += 1
+        reason = f"{self.name} renderer unresponsive for " \
+                 f"{time.monotonic() - self.failing_since:.0f} s"
+        self._logger.warning("%s, recovery step: %s", reason, step)
+        if self.step == 1:
+            LOGS.dump(reason)
+
+        match step:
+            case "reload":
+                try:
+                    await browser.reload()
+                except (CDPError, asyncio.TimeoutError):
+                    self._logger.warning("reload did not go through")
+            case "renderer":
+                killed = await asyncio.get_running_loop().run_in_executor(
+                    None, kill_browser, pid, True)
+                self._logger.info("killed %d renderer processes", killed)
+                try:
+                    await browser.reload_all()
+                except (CDPError, asyncio.TimeoutError):
+                    self._logger.warning("tabs did not reload")
+            case "browser":
+                message_queue.put_nowait({"command": "restart",
+                                          "arg": {"reason": reason}})
+            case "process":
+                SUPERVISOR.restart_process(reason)
+
+    def enabled(self) -> bool:
+        return self.config.renderer_check_interval > 0
+
+    async def run(self, browser, pid: int, message_queue):
+        while self.enabled():
+            await asyncio.sleep(self.config.renderer_check_interval)
+            if not self.active:
+                self.beat()
+                continue
+
+            if await self._probe(browser):
+                self.beat()
+                if self.failing_since is not None:
+                    SUPERVISOR.recovered(
+                        self.name, time.monotonic() - self.failing_since)
+                    self.failing_since = None
+                    self.step = 0
+                continue
+
+            if self.failing_since is None:
+                self.failing_since = time.monotonic()
+            await self._recover(browser, pid, message_queue)
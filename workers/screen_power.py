@@ -0,0 +1,176 @@
+import asyncio
+import glob
+import os
+import time
+import logging
+from datetime import datetime, timedelta
+
+INPUT_DEVICES = "/dev/input/event*"
+INPUT_READ_SIZE = 4096
+SCHEDULE_WAKE_TIMEOUT = 60
+
+
+def parse_schedule(schedule: str):
+    if not schedule:
+        return None
+    off, on = schedule.split("-")
+    return tuple(datetime.strptime(edge.strip(), "%H:%M").time()
+                 for edge in (off, on))
+
+
+class ScreenPolicy:
+    def __init__(self, message_bus, config):
+        self._logger = logging.getLogger("ScreenPolicy")
+
+        self.message_bus = message_bus
+        self.idle_timeout = config.screen_idle_timeout
+        self.schedule = config.screen_off_schedule
+
+        self.loop = None
+        self.input_fds = []
+        self.last_input = time.monotonic()
+        self.screen_on = True
+        self.changed = asyncio.Event()
+        self.worker_task = None
+
+    def start(self):
+        if self.worker_task is not None:
+            return
+        self.loop = asyncio.get_running_loop()
+        self.last_input = time.monotonic()
+        if not (self.idle_timeout or self.schedule):
+            return
+
+        self.screen_on = not self._in_off_window()
+        if not self.screen_on:
+            self._logger.info("starting inside the off schedule")
+        self._open_inputs()
+        self.worker_task = asyncio.create_task(self._timer(),
+                                               name="screen_policy")
+
+    async def stop(self):
+        for fd in self.input_fds:
+            self.loop.remove_reader(fd)
+            os.close(fd)
+        self.input_fds = []
+        if self.worker_task is not None:
+            self.worker_task.cancel()
+            await asyncio.gather(self.worker_task, return_exceptions=True)
+            self.worker_task = None
+
+    async def apply_config(self, config):
+        if (config.screen_idle_timeout, config.screen_off_schedule) == \
+                (self.idle_timeout, self.schedule):
+            return
+        await self.stop()
+        self.idle_timeout = config.screen_idle_timeout
+        self.schedule = config.screen_off_schedule
+        screen_on, self.screen_on = self.screen_on, True
+        self.start()
+        if self.screen_on != screen_on:
+            self._request(self.screen_on, "screen policy changed")
+
+    def notify(self, screen_on: bool):
+        self.screen_on = screen_on
+        if screen_on:
+            self.last_input = time.monotonic()
+        self.changed.set()
+
+    def _open_inputs(self):
+        for path in sorted(glob.glob(INPUT_DEVICES)):
+            try:
+                fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+            except OSError as e:
+                self._logger.warning("cannot watch %s: %s", path, e)
+                continue
+            self.loop.add_reader(fd, self._on_input, fd)
+            self.input_fds.append(fd)
+        self._logger.info("watching %d input devices", len(self.input_fds))
+
+    def _on_input(self, fd: int):
+        try:
+            while os.read(fd, INPUT_READ_SIZE):
+                pass
+        except BlockingIOError:
+            pass
+        except OSError:
+            self._logger.info("input device %d went away", fd)
+            self.loop.remove_reader(fd)
+            os.close(fd)
+            self.input_fds.remove(fd)
+            return
+
+        self.last_input = time.monotonic()
+        if not self.screen_on:
+            self._request(True, "input")
+
+    def _request(self, screen_on: bool, reason: str):
+        self._logger.info("screen %s (%s)", "on" if screen_on else "off",
+                          reason)
+        self.screen_on = screen_on
+        self.changed.set()
+        self.message_bus.put({"command": "screen_power",
+                              "arg": "ON" if screen_on else "OFF",
+                              "source": "policy"})
+
+    def _next_edge(self) -> tuple:
+        now = datetime.now()
+        edges = []
+        for edge, screen_on in zip(self.schedule, (False, True)):
+            at = datetime.combine(now.date(), edge)
+            if at <= now:
+                at += timedelta(days=1)
+            edges.append((at, screen_on))
+        at, screen_on = min(edges)
+        return (at - now).total_seconds(), screen_on
+
+    def _in_off_window(self) -> bool:
+        if not self.schedule:
+            return False
+        _, screen_on = self._next_edge()
+        return screen_on
+
+    def _idle_timeout(self) -> float:
+        if self.idle_timeout:
+            return self.idle_timeout
+        if self._in_off_window():
+            return SCHEDULE_WAKE_TIMEOUT
+        return 0
+
+    async def _timer(self):
+        while True:
+            timeouts = []
+            idle_timeout = self._idle_timeout()
+            if idle_timeout and self.screen_on:
+                timeouts.append(
+                    (self.last_input + idle_timeout - time.monotonic(),
+                     "idle"))
+            if self.schedule:
+                delay, screen_on = self._next_edge()
+                timeouts.append((delay, "schedule" if not screen_on
+                                 else "schedule_end"))
+
+            delay, reason = min(timeouts, default=(None, None))
+            self.changed.clear()
+            try:
+                await asyncio.wait_for(
+                    self.changed.wait(), None if delay is None else max(0, delay))
+                continue
+            except TimeoutError:
+                pass
+
+            match reason:
+                case "idle":
+                    idle = time.monotonic() - self.last_input
+                    idle_timeout = self._idle_timeout()
+                    if idle_timeout and self.screen_on and \
+                            idle >= idle_timeout:
+                        self._request(False, f"idle for {idle:.0f} s")
+                case "schedule":
+                    if self.screen_on:
+                        self._request(False, "schedule")
+                    await asyncio.sleep(1)
+                case "schedule_end":
+                    if not self.screen_on:
+                        self._request(True, "schedule")
+                    await asyncio.sleep(1)
@@ -0,0 +1,106 @@
+import asyncio
+import base64
+import hashlib
+import time
+import logging
+
+import psutil
+
+from workers.cdp import CDPError
+
+PROBE_WIDTH = 160
+BUDGET_SMOOTHING = 0.3
+BUDGET_PAUSE_INTERVALS = 10
+
+
+def tree_cpu_time(root: psutil.Process) -> float:
+    try:
+        processes = [root] + root.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return 0
+    total = 0
+    for process in processes:
+        try:
+            times = process.cpu_times()
+        except psutil.NoSuchProcess:
+            continue
+        total += times.user + times.system
+    return total
+
+
+class ScreenshotPublisher:
+    def __init__(self, push_image, browser, viewport: tuple, pid: int,
+                 config):
+        self._logger = logging.getLogger("ScreenshotPublisher")
+
+        self.push_image = push_image
+        self.browser = browser
+        self.viewport = viewport
+        self.root = psutil.Process(pid)
+        self.config = config
+
+        self.active = True
+        self.last_digest = None
+        self.cost = 0
+        self.frames = {"captured": 0, "unchanged": 0, "paused": 0}
+
+    async def _capture(self) -> bytes | None:
+        probe = await self.browser.capture_screenshot(
+            "png", PROBE_WIDTH / self.viewport[0], self.viewport)
+        digest = hashlib.blake2b(probe.encode(), digest_size=16).digest()
+        if digest == self.last_digest:
+            self.frames["unchanged"] += 1
+            return None
+        self.last_digest = digest
+
+        frame = await self.browser.capture_screenshot(
+            "jpeg", min(1, self.config.screenshot_width / self.viewport[0]),
+            self.viewport, self.config.screenshot_quality)
+        self.frames["captured"] += 1
+        return base64.b64decode(frame)
+
+    def _charge(self, elapsed: float, interval: float) -> bool:
+        usage = elapsed / interval * 100
+        self.cost += (usage - self.cost) * BUDGET_SMOOTHING
+        return self.cost > self.config.screenshot_cpu_budget
+
+    def enabled(self) -> bool:
+        return self.config.screenshot_interval > 0
+
+    async def run(self):
+        while self.enabled():
+            await asyncio.sleep(self.config.screenshot_interval)
+            interval = self.config.screenshot_interval
+            if interval <= 0:
+                return
+            if not self.active:
+                continue
+
+            loop = asyncio.get_running_loop()
+            browser_started = await loop.run_in_executor(None, tree_cpu_time,
+                                                         self.root)
+            cpu_started = time.process_time()
+            try:
+                image = await self._capture()
+            except (CDPError, asyncio.TimeoutError):
+                self._logger.debug("screenshot failed", exc_info=True)
+                continue
+            if image is not None:
+                self.push_image(image)
+
+            browser_cpu = await loop.run_in_executor(None, tree_cpu_time,
+                                                     self.root)
+            elapsed = max(0, browser_cpu - browser_started) + \
+                time.process_time() - cpu_started
+            if self._charge(elapsed, interval):
+                self._logger.warning(
+                    "screenshot cost %.1f%% is over the %.1f%% budget, "
+                    "pausing for %d intervals", self.cost,
+                    self.config.screenshot_cpu_budget, BUDGET_PAUSE_INTERVALS)
+                self.frames["paused"] += 1
+                await asyncio.sleep(interval * BUDGET_PAUSE_INTERVALS)
+                self.cost = 0
+                self.last_digest = None
+
+            self._logger.debug("screenshot frames: %s, cost %.2f%%",
+                               self.frames, self.cost)
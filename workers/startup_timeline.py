@@ -0,0 +1,31 @@
+import time
+import logging
+
+import psutil
+
+
+class StartupTimeline:
+    def __init__(self):
+        self._logger = logging.getLogger("StartupTimeline")
+
+        self.started = time.monotonic()
+        self.offset = time.time() - psutil.Process().create_time()
+        self.phases = {}
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started + self.offset
+
+    def mark(self, phase: str) -> float | None:
+        if phase in self.phases:
+            return None
+        self.phases[phase] = self.elapsed()
+        self._logger.info("startup phase %s reached at %.2f s",
+                          phase, self.phases[phase])
+        return self.phases[phase]
+
+    def summary(self) -> str:
+        return ", ".join(f"{phase}={elapsed:.2f}s"
+                         for phase, elapsed in self.phases.items())
+
+
+TIMELINE = StartupTimeline()
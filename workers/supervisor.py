@@ -0,0 +1,150 @@
+import asyncio
+import inspect
+import os
+import socket
+import time
+import logging
+from collections import defaultdict, deque
+
+from workers.log_pipeline import LOGS
+
+RESTART_WINDOW = 600
+RECOVERY_WINDOW = 32
+
+
+def sd_notify(state: str) -> bool:
+    address = os.getenv("NOTIFY_SOCKET")
+    if not address:
+        return False
+    if address.startswith("@"):
+        address = "\0" + address[1:]
+    try:
+        with socket.socket(socket.AF_UNIX,
+                           socket.SOCK_DGRAM | socket.SOCK_CLOEXEC) as sock:
+            sock.connect(address)
+            sock.sendall(state.encode())
+    except OSError:
+        logging.getLogger("Supervisor").debug("sd_notify failed",
+                                              exc_info=True)
+        return False
+    return True
+
+
+def watchdog_interval() -> float | None:
+    usec = os.getenv("WATCHDOG_USEC")
+    pid = os.getenv("WATCHDOG_PID")
+    if not usec or (pid and int(pid) != os.getpid()):
+        return None
+    return int(usec) / 2e6
+
+
+class Supervisor:
+    HANDLED_COMMANDS = ["config_changed"]
+
+    def __init__(self):
+        self._logger = logging.getLogger("Supervisor")
+
+        self.config = None
+        self.watchdog_interval = None
+        self.message_bus = None
+        self.watched = {}
+        self.failing_since = {}
+        self.restarts = defaultdict(deque)
+        self.recovery_times = deque(maxlen=RECOVERY_WINDOW)
+        self.recoveries = 0
+        self.exit_code = 0
+        self.worker_task = None
+
+    def watch(self, name: str, worker):
+        self.watched[name] = worker
+
+    def recovered(self, name: str, elapsed: float):
+        self.recovery_times.append(elapsed)
+        self.recoveries += 1
+        mean = sum(self.recovery_times) / len(self.recovery_times)
+        self._logger.info("%s recovered in %.1f s (mean %.1f s over %d)",
+                          name, elapsed, mean, len(self.recovery_times))
+        self._push_sensors({"recovery_time": round(mean, 1),
+                            "recoveries": self.recoveries})
+
+    def restart_process(self, reason: str):
+        if self.exit_code:
+            return
+        self._logger.error("restarting the service: %s", reason)
+        LOGS.dump(reason)
+        self.exit_code = 1
+        self.message_bus.put({"command": "exit"})
+
+    def _push_sensors(self, sensors: dict):
+        if self.message_bus is not None:
+            self.message_bus.put({"command": "sensors_push", "arg": sensors})
+
+    def start(self, message_bus, config):
+        if self.worker_task is not None:
+            return
+        self.message_bus = message_bus
+        self.config = config
+
+        self.watchdog_interval = watchdog_interval()
+        if self.watchdog_interval is not None:
+            self._logger.info("systemd watchdog enabled, pinging every %.1f s",
+                              self._interval())
+        self.worker_task = asyncio.create_task(self._run(), name="supervisor")
+        self._push_sensors({"recoveries": self.recoveries})
+        sd_notify("READY=1")
+
+    def push_command(self, message):
+        self.config = message["arg"]["config"]
+
+    def _interval(self) -> float:
+        if self.watchdog_interval is None:
+            return self.config.supervisor_interval
+        return min(self.config.supervisor_interval, self.watchdog_interval)
+
+    async def stop(self):
+        if self.worker_task is None:
+            return
+        sd_notify("STOPPING=1")
+        self.worker_task.cancel()
+        await asyncio.gather(self.worker_task, return_exceptions=True)
+        self.worker_task = None
+
+    def _escalate(self, name: str) -> bool:
+        now = time.monotonic()
+        restarts = self.restarts[name]
+        while restarts and now - restarts[0] > RESTART_WINDOW:
+            restarts.popleft()
+        restarts.append(now)
+        return len(restarts) > self.config.supervisor_max_restarts
+
+    async def _check(self, name: str, worker):
+        if worker.is_alive():
+            failing_since = self.failing_since.pop(name, None)
+            if failing_since is not None:
+                self.recovered(name, time.monotonic() - failing_since)
+            return
+
+        self.failing_since.setdefault(name, time.monotonic())
+        if self._escalate(name):
+            self.restart_process(f"{name} failed {len(self.restarts[name])} "
+                                 f"times in {RESTART_WINDOW} s")
+            return
+
+        self._logger.error("%s is not responding, restarting it", name)
+        result = worker.restart()
+        if inspect.isawaitable(result):
+            await result
+
+    async def _run(self):
+        while True:
+            for name, worker in list(self.watched.items()):
+                try:
+                    await self._check(name, worker)
+                except Exception:
+                    self._logger.exception("recovery of %s failed", name)
+            if not self.exit_code:
+                sd_notify("WATCHDOG=1")
+            await asyncio.sleep(self._interval())
+
+
+SUPERVISOR = Supervisor()
@@ -0,0 +1,82 @@
+import os
+import glob
+import logging
+
+READ_SIZE = 64
+
+CPU_HWMON_NAMES = ["coretemp", "k10temp", "zenpower",
+                   "cpu_thermal", "cpu-thermal", "soc_thermal"]
+CPU_THERMAL_TYPES = ["cpu", "soc", "x86_pkg_temp", "acpitz"]
+
+
+class SysfsReader:
+    def __init__(self, path: str):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+
+    def read(self) -> str:
+        return os.pread(self.fd, READ_SIZE, 0).decode().strip()
+
+    def read_int(self) -> int:
+        return int(self.read())
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def _read_once(path: str) -> str:
+    with open(path) as file:
+        return file.read().strip()
+
+
+class TemperatureReader:
+    def __init__(self):
+        self._logger = logging.getLogger("TemperatureReader")
+
+        self.readers = [SysfsReader(path) for path in self._discover()]
+        if self.readers:
+            self._logger.info("reading cpu temperature from %s",
+                              ", ".join(reader.path for reader in self.readers))
+        else:
+            self._logger.warning("no cpu temperature source found")
+
+    def _discover(self) -> list:
+        for hwmon in sorted(glob.glob("/sys/class/hwmon/hwmon*")):
+            try:
+                name = _read_once(os.path.join(hwmon, "name"))
+            except OSError:
+                continue
+            if name in CPU_HWMON_NAMES:
+                inputs = sorted(glob.glob(os.path.join(hwmon, "temp*_input")))
+                if inputs:
+                    return inputs
+
+        zones = []
+        for zone in sorted(glob.glob("/sys/class/thermal/thermal_zone*")):
+            try:
+                zone_type = _read_once(os.path.join(zone, "type")).lower()
+            except OSError:
+                continue
+            zones.append((zone_type, os.path.join(zone, "temp")))
+
+        cpu_zones = [path for zone_type, path in zones
+                     if any(cpu_type in zone_type
+                            for cpu_type in CPU_THERMAL_TYPES)]
+        return cpu_zones or [path for _, path in zones]
+
+    def read(self) -> float:
+        values = []
+        for reader in self.readers:
+            try:
+                values.append(reader.read_int() / 1000)
+            except (OSError, ValueError):
+                continue
+        if not values:
+            return -1
+        return round(sum(values) / len(values), 1)
+
+    def close(self):
+        for reader in self.readers:
+            reader.close()
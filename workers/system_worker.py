@@ -1,138 +1,250 @@
-import queue
-import os
+import asyncio
 import time
 import psutil
 import logging
-import screen_brightness_control as sbc
-import sdbus
-from sdbus_block.networkmanager import (
-    NetworkManager,
-    NetworkDeviceGeneric,
-    ActiveConnection
-)
-from threading import Thread
+from functools import partial
 
+from const.sensors import SENSOR_OPTIONS
+from workers.backlight import Backlight, SbcBacklight
+from workers.config import Config
+from workers.displays import load_displays, base_key
+from workers.log_pipeline import LOGS
+from workers.metrics import METRICS
+from workers.network_monitor import NetworkMonitor
+from workers.screen_power import ScreenPolicy
+from workers.sysfs import TemperatureReader
 
-class SystemWorker:
-    def __init__(self, MESSAGE_QUEUE: queue.Queue):
-        self._logger = logging.getLogger("SystemWorker")
+SAMPLE_BATCH_WINDOW = 0.5
+QUEUE_SIZE = 64
 
-        self.message_queue = MESSAGE_QUEUE
-
-        self.worker_queue = queue.Queue()
-        self.worker_thread = Thread(target=self._thread, name="system_thread")
-        self.worker_timer = Thread(target=self._timer, name="system_timer")
-        self.terminate = False
-        self.send_message_counter = 0
-        self.last_dev_state = 0
 
-        self.sdbus = sdbus.sd_bus_open_system()
-
-        self.brightness_target = None
+class SystemWorker:
+    HANDLED_COMMANDS = ["set_brightness", "screen_power", "reboot",
+                        "dump_logs", "config_changed"]
 
-        logging.getLogger('screen_brightness_control').setLevel(logging.FATAL)
-        monitors = [monitor for monitor in sbc.list_monitors_info(
-        ) if monitor["method"] is not sbc.linux.XRandr]
-        if len(monitors) != 0:
-            self.brightness_target = sbc.Display.from_dict(monitors[0])
+    def __init__(self, message_bus, network_monitor=None,
+                 brightness_target=None, screen_policy=None, displays=None,
+                 config=None):
+        self._logger = logging.getLogger("SystemWorker")
 
-    def _get_iface_state(self):
-        nm = NetworkManager(self.sdbus)
-        path = nm.get_device_by_ip_iface(os.getenv("IFNAME"))
-        self.network_dev = NetworkDeviceGeneric(path, self.sdbus)
+        self.message_bus = message_bus
+        self.config = config or Config.from_env()
+        self.displays = displays or load_displays(self.config)
 
-        active_connection = ""
-        if not self.network_dev.active_connection == "/":
-            active_connection = ActiveConnection(
-                self.network_dev.active_connection, self.sdbus).id
+        self.loop = None
+        self.worker_queue = None
+        self.worker_tasks = []
+        self.terminate = False
 
-        state = {
-            "state": self.network_dev.state,
-            "name": active_connection
+        self.network_monitor = network_monitor or NetworkMonitor(
+            message_bus, self.config.ifname)
+        self.screen_policy = screen_policy or ScreenPolicy(message_bus,
+                                                        self.config)
+
+        self.boot_time = psutil.boot_time()
+        self.temperature_reader = None
+        self.brightness_targets = {}
+        if brightness_target is not None:
+            self.brightness_targets[self.displays[0].name] = brightness_target
+        self.sensor_readers = {
+            "cputemp": self._get_temperature,
+            "uptime": self._get_uptime
         }
-        return state
+        for display in self.displays:
+            self.sensor_readers[display.key("brightness")] = partial(
+                self._get_brightness, display)
+
+    async def _discover_devices(self):
+        self.temperature_reader = TemperatureReader()
+        for display in self.displays:
+            if display.name in self.brightness_targets:
+                continue
+            if display.primary or display.backlight is not None:
+                target = await self.loop.run_in_executor(
+                    None, Backlight.discover, display.backlight)
+                if target is not None:
+                    self.brightness_targets[display.name] = target
+
+        primary = self.displays[0]
+        if primary.name not in self.brightness_targets:
+            try:
+                target = await self.loop.run_in_executor(
+                    None, SbcBacklight.discover)
+            except Exception:
+                self._logger.warning("no brightness control available",
+                                     exc_info=True)
+            else:
+                if target is not None:
+                    self.brightness_targets[primary.name] = target
+
+    async def _apply_config(self, config: Config, changed: list):
+        self.config = config
+        await self.screen_policy.apply_config(config)
+        if "ifname" in changed:
+            self._logger.info("watching interface %s", config.ifname)
+            await self.network_monitor.stop()
+            self.network_monitor.ifname = config.ifname
+            self.network_monitor.device = None
+            self.network_monitor.last_state = None
+            self.network_monitor.start()
+
+        primary = self.displays[0]
+        if "backlight_device" in changed and config.displays is None:
+            self._logger.info("switching backlight to %s",
+                              config.backlight_device)
+            primary.backlight = config.backlight_device
+            target = await self.loop.run_in_executor(
+                None, Backlight.discover, primary.backlight)
+            if target is not None:
+                self.brightness_targets[primary.name] = target
+            self.message_bus.put({"command": "sensors_push",
+                                  "arg": {primary.key("brightness"):
+                                          self._get_brightness(primary)}})
 
     def _get_uptime(self) -> int:
-        return int(time.time() - psutil.boot_time())
+        return int(time.time() - self.boot_time)
 
-    def _get_brightness(self) -> int:
-        if self.brightness_target:
-            return int(self.brightness_target.get_brightness())
+    def _get_brightness(self, display) -> int:
+        target = self.brightness_targets.get(display.name)
+        if target:
+            return target.get_brightness()
         else:
             return 0
 
-    def _set_brightness(self, value: int):
-        if self.brightness_target and value <= 100 and value >= 0:
-            self.brightness_target.fade_brightness(finish=value, display=self.brightness_target)
+    def _target_displays(self, message) -> list:
+        if message.get("source") == "policy":
+            return self.displays
+        return [display for display in self.displays if display.owns(message)]
+
+    def _set_brightness(self, display, value: int):
+        target = self.brightness_targets.get(display.name)
+        if target and value <= 100 and value >= 0:
+            target.set_brightness(value)
+            self.message_bus.put({"command": "sensors_push",
+                                  "arg": {display.key("brightness"): value}})
+
+    def _set_screen_power(self, display, value, force: bool = False):
+        on = value in (True, 1, "ON", "on")
+        target = self.brightness_targets.get(display.name)
+        if target is None or (not force and on == target.get_power()):
+            return
 
-    def _get_temperature(self) -> float:
-        if psutil.WINDOWS:
-            return -1
+        try:
+            target.set_power(on)
+        except OSError:
+            self._logger.warning("cannot switch screen power of %s",
+                                 display.name, exc_info=True)
+            return
 
-        temps = psutil.sensors_temperatures()
+        self.message_bus.put({"command": "page_visibility", "arg": on,
+                              "display": display.name})
+        self.message_bus.put({"command": "sensors_push",
+                              "arg": {display.key("screen_power"):
+                                      "ON" if on else "OFF"}})
 
-        if "coretemp" in temps:
-            coretemps = [temp.current for temp in temps["coretemp"]]
-            return sum(coretemps) / len(coretemps)
-        else:
-            return -1
+    def _notify_screen_policy(self):
+        if not self.brightness_targets:
+            self.screen_policy.notify(True)
+            return
+        self.screen_policy.notify(any(
+            target.get_power() for target in self.brightness_targets.values()))
+
+    def _get_temperature(self) -> float:
+        return self.temperature_reader.read()
+
+    def _read_sensors(self, sensors: list) -> dict:
+        return {sensor: self.sensor_readers[sensor]() for sensor in sensors}
 
     def start(self):
-        if self.worker_thread.is_alive():
+        if self.worker_tasks:
             return
 
         self.terminate = False
+        self.loop = asyncio.get_running_loop()
+        self.worker_queue = METRICS.queue("system", QUEUE_SIZE)
 
-        self.worker_thread.start()
+        self.network_monitor.start()
+        self.screen_policy.start()
+        self.worker_tasks = [
+            asyncio.create_task(self._thread(), name="system_thread"),
+            asyncio.create_task(self._timer(), name="system_timer")
+        ]
 
-    def stop(self):
+    async def stop(self):
         if self.terminate:
             return
         self.terminate = True
 
+        self.worker_queue.put_nowait(None)
+        await self.network_monitor.stop()
+        await self.screen_policy.stop()
+
+        self.worker_tasks[1].cancel()
+        await asyncio.gather(*self.worker_tasks, return_exceptions=True)
+        self.worker_tasks = []
+
     def push_command(self, message):
-        self.worker_queue.put(message)
+        self.worker_queue.put_nowait(message)
 
-    def _thread(self):
-        try:
-            self._logger.info("%s thread started", self.worker_thread.name)
+    def is_alive(self) -> bool:
+        return self.terminate or not any(task.done()
+                                         for task in self.worker_tasks)
 
-            self.worker_timer.start()
+    async def restart(self):
+        await self.stop()
+        self.start()
+
+    async def _thread(self):
+        try:
+            self._logger.info("system task started")
 
             while not self.terminate:
-                time.sleep(0.1)
-                if self.worker_queue.empty():
-                    continue
-                message = self.worker_queue.get()
+                message = await self.worker_queue.get()
+                if message is None:
+                    break
 
                 match message["command"]:
                     case "set_brightness":
-                        self._set_brightness(message["arg"])
+                        for display in self._target_displays(message):
+                            self._set_brightness(display, message["arg"])
+                    case "screen_power":
+                        for display in self._target_displays(message):
+                            self._set_screen_power(display, message["arg"])
+                        self._notify_screen_policy()
+                    case "dump_logs":
+                        LOGS.dump("dump_logs command")
+                    case "config_changed":
+                        await self._apply_config(message["arg"]["config"],
+                                                 message["arg"]["changed"])
                     case "reboot":
-                        os.system("reboot")
+                        process = await asyncio.create_subprocess_exec("reboot")
+                        await process.wait()
+
+                self.message_bus.complete(message)
         except Exception:
-            self._logger.exception("fatal exception in thread %s",
-                                   self.worker_thread.name, exc_info=True)
+            self._logger.exception("fatal exception in system task",
+                                   exc_info=True)
 
-    def _timer(self):
+    async def _timer(self):
+        await self._discover_devices()
+        for display in self.displays:
+            self._set_screen_power(display, self.screen_policy.screen_on,
+                                   force=True)
+
+        next_sample = dict.fromkeys(self.sensor_readers, time.monotonic())
         while not self.terminate:
-            time.sleep(2)
-            if self.send_message_counter >= 3:
-                sensors_cache = {
-                    "cputemp": self._get_temperature(),
-                    "brightness": self._get_brightness(),
-                    "uptime": self._get_uptime()
-                }
-                self.message_queue.put(
-                    {"command": "sensors_push", "arg": sensors_cache})
-                self.send_message_counter = 0
-            self.send_message_counter += 1
+            now = time.monotonic()
+            due = [sensor for sensor, sample_at in next_sample.items()
+                   if sample_at <= now + SAMPLE_BATCH_WINDOW]
 
-            new_if_state = self._get_iface_state()
+            if due:
+                sensors_cache = self._read_sensors(due)
+                self.message_bus.put(
+                    {"command": "sensors_push", "arg": sensors_cache})
+                for sensor in due:
+                    next_sample[sensor] = max(
+                        next_sample[sensor] +
+                        SENSOR_OPTIONS[base_key(sensor)]["interval"],
+                        now)
 
-            if new_if_state["state"] != self.last_dev_state:
-                self.message_queue.put({
-                    "command": "if_state",
-                    "arg": new_if_state
-                })
-                self.last_dev_state = new_if_state["state"]
+            await asyncio.sleep(max(0, min(next_sample.values()) - time.monotonic()))